@@ -0,0 +1,434 @@
+import asyncio
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from audiostation import AudioStationClient, parse_song_entry
+from transport import RETRY_STATUS_CODES
+
+def _connection_not_made(error):
+    """
+    aiohttp 请求异常是否发生在连接建立之前，此时请求一定没有送达服务器
+    """
+    return isinstance(error, (aiohttp.ClientConnectorError, getattr(aiohttp, 'ConnectionTimeoutError', ())))
+
+class AsyncAudioStationClient:
+    """
+    基于 asyncio 和 aiohttp 的 AudioStation 客户端，接口与 AudioStationClient 相同，
+    网络方法均为协程。歌曲库分页、歌单写入和多歌单导入可以在一个线程中同时发出大量请求。
+    歌曲缓存、索引和匹配逻辑复用 AudioStationClient，匹配在线程池中执行，不阻塞事件循环。
+
+    用法:
+        async with AsyncAudioStationClient(host, username, password) as client:
+            await client.get_available_endpoints()
+            await client.login()
+            await client.fetch_all_songs()
+    """
+    def __init__(self, host, username, password, device_name='PythonPlayer',
+                 max_connections=100, retries=3, backoff_factor=0.5, timeout=10):
+        if aiohttp is None:
+            raise ImportError("AsyncAudioStationClient 需要安装 aiohttp")
+        self.host = host.rstrip('/')
+        self.username = username
+        self.password = password
+        self.device_name = device_name
+        self.max_connections = max_connections
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.session = None
+        self.endpoints = {}
+        self.sid = None
+        self.did = None
+        # 同时在途的请求数上限
+        self.semaphore = asyncio.Semaphore(max_connections)
+        # 只用于匹配的同步客户端，不发出网络请求
+        self.matcher = AudioStationClient(host, username, password, device_name)
+        # 匹配会改写 matcher 的 match_stats 并保存匹配缓存文件，同时导入多个歌单时依次匹配
+        self.match_lock = asyncio.Lock()
+
+    @property
+    def all_songs_cache(self):
+        return self.matcher.all_songs_cache
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, ssl=False)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"Accept-Encoding": "gzip, deflate"}
+            )
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _call_api(self, api, payload, action, log_func=None, path=None, http_method='POST',
+                        timeout=None, idempotent=True, errors=None):
+        """
+        调用 AudioStation WebAPI 并解析 JSON，对 5xx 和超时按指数退避重试
+        idempotent 为 False 的请求只在连接未建立时重试
+        端点缺失、请求或解析失败时输出错误信息并返回 None
+        errors: 传入列表时，请求失败的异常会追加到其中，供调用方区分失败原因
+        """
+        if path is None:
+            api_info = self.endpoints.get(api)
+            if not api_info:
+                print(f"{api.rsplit('.', 1)[-1]} 端点未找到")
+                if log_func:
+                    log_func(f"{api.rsplit('.', 1)[-1]} 端点未找到")
+                return None
+            path = api_info['path']
+        await self.open()
+        url = f"{self.host}/webapi/{path}"
+        params = {key: str(value) for key, value in payload.items()}
+        request_timeout = aiohttp.ClientTimeout(total=timeout or self.timeout)
+        attempt = 0
+        while True:
+            try:
+                async with self.semaphore:
+                    if http_method == 'GET':
+                        request = self.session.get(url, params=params, timeout=request_timeout)
+                    else:
+                        request = self.session.post(url, data=params, timeout=request_timeout)
+                    async with request as response:
+                        if response.status in RETRY_STATUS_CODES and idempotent and attempt < self.retries:
+                            attempt += 1
+                            await asyncio.sleep(self.backoff_factor * (2 ** (attempt - 1)))
+                            continue
+                        response.raise_for_status()
+                        return await response.json(content_type=None)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if (idempotent or _connection_not_made(e)) and attempt < self.retries:
+                    attempt += 1
+                    await asyncio.sleep(self.backoff_factor * (2 ** (attempt - 1)))
+                    continue
+                if errors is not None:
+                    errors.append(e)
+                print(f"{action}请求失败: {e!r}")
+                if log_func:
+                    log_func(f"{action}请求失败: {e!r}")
+            except aiohttp.ClientError as e:
+                if errors is not None:
+                    errors.append(e)
+                print(f"{action}请求失败: {e}")
+                if log_func:
+                    log_func(f"{action}请求失败: {e}")
+            except ValueError as e:
+                if errors is not None:
+                    errors.append(e)
+                print("无法解析 JSON 响应")
+                if log_func:
+                    log_func("无法解析 JSON 响应")
+            return None
+
+    async def get_available_endpoints(self):
+        data = await self._call_api("SYNO.API.Info", {
+            "version": 1,
+            "api": "SYNO.API.Info",
+            "method": "query",
+            "query": "all"
+        }, "获取可用端点", path="query.cgi", http_method='GET')
+        if data is None:
+            return False
+        if data.get('success'):
+            self.endpoints = data['data']
+            return True
+        else:
+            print("无法获取可用端点")
+            return False
+
+    async def login(self):
+        data = await self._call_api("SYNO.API.Auth", {
+            "version": 6,
+            "api": "SYNO.API.Auth",
+            "method": "login",
+            "session": "AudioStation",
+            "device_name": self.device_name,
+            "account": self.username,
+            "passwd": self.password,
+            "enable_device_token": "yes"
+        }, "登录")
+        if data is None:
+            return False
+        if data.get('success'):
+            self.sid = data['data']['sid']
+            self.did = data['data'].get('did')
+            print("登录成功")
+            return True
+        elif data.get('error', {}).get('code') == 403:
+            print("需要 OTP 验证。")
+            return False
+        else:
+            print("登录失败")
+            return False
+
+    async def _fetch_song_page(self, offset, limit, log_func=None):
+        data = await self._call_api("SYNO.AudioStation.Song", {
+            "version": 3,
+            "api": "SYNO.AudioStation.Song",
+            "method": "list",
+            "library": "all",
+            "offset": offset,
+            "limit": limit,
+            "additional": "song_tag,song_audio,song_rating",
+            "_sid": self.sid
+        }, "获取歌曲列表", log_func, http_method='GET')
+        if data is None:
+            return None
+        if data.get('success'):
+            return data['data']
+        print("获取歌曲列表失败")
+        if log_func:
+            log_func("获取歌曲列表失败")
+        return None
+
+    async def fetch_all_songs(self, log_func=None):
+        """
+        获取服务器上所有歌曲并缓存，第一页之后的页面同时请求
+        """
+        limit = 500
+        if log_func:
+            log_func("正在获取所有歌曲并缓存...")
+        first_page = await self._fetch_song_page(0, limit, log_func)
+        if first_page is None:
+            return False
+        total = first_page.get('total', 0)
+        songs = first_page.get('songs', [])
+        if log_func:
+            log_func(f"总歌曲数: {total}")
+        step = len(songs) or limit
+        offsets = range(len(songs), total, step) if songs else []
+        pages = await asyncio.gather(*(self._fetch_song_page(offset, step, log_func) for offset in offsets))
+        if any(page is None for page in pages):
+            return False
+        songs_cache = list(songs)
+        for page in pages:
+            songs_cache.extend(page.get('songs', []))
+        self.matcher._store_songs_cache(songs_cache, log_func)
+        return True
+
+    def match_song(self, title, artist, threshold=70, log_func=None):
+        """
+        在歌曲缓存中匹配单首歌曲，属于 CPU 计算，直接同步执行
+        """
+        return self.matcher.match_song(title, artist, threshold, log_func)
+
+    async def create_playlist(self, name, log_func=None):
+        """
+        创建一个新的播放列表，返回其 ID
+        """
+        data = await self._call_api("SYNO.AudioStation.Playlist", {
+            "version": 2,
+            "api": "SYNO.AudioStation.Playlist",
+            "method": "create",
+            "library": "personal",
+            "name": name,
+            "_sid": self.sid
+        }, "创建歌单", log_func, idempotent=False)
+        if data is None:
+            return None
+        if data.get('success'):
+            playlist_id = data['data']['id']
+            print(f"创建歌单成功: {name} (ID: {playlist_id})")
+            if log_func:
+                log_func(f"创建歌单成功: {name} (ID: {playlist_id})")
+            return playlist_id
+        else:
+            print(f"创建歌单失败: {name}")
+            if log_func:
+                log_func(f"创建歌单失败: {name}")
+            return None
+
+    async def add_songs_to_playlist(self, playlist_id, song_ids, log_func=None):
+        """
+        将歌曲分块追加到指定的播放列表。追加依赖请求顺序，同一歌单的各块依次发送，
+        不同歌单之间可以同时写入。失败的块与 AudioStationClient 一样先读回歌曲数确认，再决定是否重新发送。
+        """
+        chunk_size = max(1, self.matcher.add_chunk_size)
+        count = await self._playlist_song_count(playlist_id, log_func)
+        for start in range(0, len(song_ids), chunk_size):
+            chunk = song_ids[start:start + chunk_size]
+            if not await self._add_playlist_chunk(playlist_id, chunk, count, log_func):
+                print(f"添加歌曲到歌单失败 (ID: {playlist_id})，已成功添加 {start} 首歌曲")
+                if log_func:
+                    log_func(f"添加歌曲到歌单失败 (ID: {playlist_id})，已成功添加 {start} 首歌曲")
+                return False
+            if count is not None:
+                count += len(chunk)
+        print(f"成功添加 {len(song_ids)} 首歌曲到歌单 (ID: {playlist_id})")
+        if log_func:
+            log_func(f"成功添加 {len(song_ids)} 首歌曲到歌单 (ID: {playlist_id})")
+        return True
+
+    async def _add_playlist_chunk(self, playlist_id, chunk, count, log_func=None):
+        """
+        追加一块歌曲并重试，count 为添加前歌单中的歌曲数，重试规则见 AudioStationClient._add_playlist_chunk
+        """
+        unconfirmed = False
+        for attempt in range(self.matcher.add_retries + 1):
+            if attempt:
+                await asyncio.sleep(2 ** (attempt - 1))
+            if unconfirmed:
+                landed = await self._chunk_landed(playlist_id, count, len(chunk), log_func)
+                if landed:
+                    return True
+                if landed is None:
+                    continue
+                unconfirmed = False
+            errors = []
+            data = await self._call_api("SYNO.AudioStation.Playlist", {
+                "version": 2,
+                "api": "SYNO.AudioStation.Playlist",
+                "method": "updatesongs",
+                "id": playlist_id,
+                "offset": -1,
+                "limit": 0,
+                "songs": ",".join(chunk),
+                "_sid": self.sid
+            }, "添加歌曲到歌单", log_func, timeout=self.matcher.add_timeout, idempotent=False, errors=errors)
+            if data is not None and data.get('success'):
+                return True
+            unconfirmed = not (errors and _connection_not_made(errors[-1]))
+        return bool(unconfirmed and await self._chunk_landed(playlist_id, count, len(chunk), log_func))
+
+    async def _chunk_landed(self, playlist_id, count, size, log_func=None):
+        """
+        读回歌单的歌曲数，已追加 size 首返回 True，未追加返回 False，无法确认时返回 None
+        """
+        if count is None:
+            return None
+        current = await self._playlist_song_count(playlist_id, log_func)
+        if current == count + size:
+            return True
+        if current == count:
+            return False
+        if current is not None:
+            print(f"歌单中的歌曲数 ({current}) 与预期不符，无法确认歌曲是否已添加 (ID: {playlist_id})")
+            if log_func:
+                log_func(f"歌单中的歌曲数 ({current}) 与预期不符，无法确认歌曲是否已添加 (ID: {playlist_id})")
+        return None
+
+    async def _playlist_song_count(self, playlist_id, log_func=None):
+        """
+        获取歌单中当前的歌曲数，失败时返回 None
+        """
+        data = await self._call_api("SYNO.AudioStation.Playlist", {
+            "version": 2,
+            "api": "SYNO.AudioStation.Playlist",
+            "method": "getinfo",
+            "id": playlist_id,
+            "library": "personal",
+            "additional": "songs",
+            "_sid": self.sid
+        }, "获取歌单信息", log_func)
+        if data is None:
+            return None
+        playlists = data.get('data', {}).get('playlists') if data.get('success') else None
+        if not playlists:
+            print(f"获取歌单信息失败 (ID: {playlist_id})")
+            if log_func:
+                log_func(f"获取歌单信息失败 (ID: {playlist_id})")
+            return None
+        additional = playlists[0].get('additional', {})
+        total = additional.get('songs_total')
+        return total if total is not None else len(additional.get('songs', []))
+
+    async def import_playlist_from_song_list(self, song_list, playlist_name, threshold=70, log_func=None):
+        """
+        从歌曲列表导入歌单并创建新的播放列表，匹配在线程池中执行
+        """
+        song_entries = []
+        for song in song_list:
+            entry = parse_song_entry(song)
+            if not entry:
+                if log_func:
+                    log_func(f"无效的歌曲格式: {song}")
+                continue
+            song_entries.append(entry)
+
+        async with self.match_lock:
+            song_ids = await asyncio.to_thread(self.matcher.match_song_entries, song_entries, threshold, log_func)
+        if not song_ids:
+            if log_func:
+                log_func("没有找到任何匹配的歌曲")
+            return False
+
+        new_playlist_id = await self.create_playlist(playlist_name, log_func)
+        if not new_playlist_id:
+            if log_func:
+                log_func("无法创建新的播放列表")
+            return False
+
+        if await self.add_songs_to_playlist(new_playlist_id, song_ids, log_func):
+            if log_func:
+                log_func(f"歌单 '{playlist_name}' 导入完成，共添加 {len(song_ids)} 首歌曲。")
+            return True
+        else:
+            if log_func:
+                log_func("添加歌曲到歌单时发生错误")
+            return False
+
+    async def import_playlists(self, items, threshold=70, log_func=None):
+        """
+        同时导入多个歌单，items 为 [(song_list, playlist_name), ...]，返回与输入顺序一致的结果列表
+        各歌单的匹配依次进行，创建歌单和添加歌曲的请求并发发出
+        """
+        return await asyncio.gather(*(
+            self.import_playlist_from_song_list(song_list, playlist_name, threshold, log_func)
+            for song_list, playlist_name in items
+        ))
+
+    async def get_playlist_list(self):
+        """
+        获取当前所有播放列表。
+        """
+        data = await self._call_api("SYNO.AudioStation.Playlist", {
+            "version": 2,
+            "api": "SYNO.AudioStation.Playlist",
+            "method": "list",
+            "library": "personal",
+            "_sid": self.sid
+        }, "获取播放列表")
+        if data is None:
+            return []
+        if data.get('success'):
+            return data['data'].get('playlists', [])
+        else:
+            print("获取播放列表失败")
+            return []
+
+    async def delete_playlist(self, playlist_id, log_func=None):
+        """
+        删除指定的播放列表。
+        """
+        data = await self._call_api("SYNO.AudioStation.Playlist", {
+            "version": 2,
+            "api": "SYNO.AudioStation.Playlist",
+            "method": "delete",
+            "id": playlist_id,
+            "_sid": self.sid
+        }, "删除播放列表", log_func, idempotent=False)
+        if data is None:
+            return False
+        if data.get('success'):
+            print(f"成功删除歌单 ID: {playlist_id}")
+            if log_func:
+                log_func(f"成功删除歌单 ID: {playlist_id}")
+            return True
+        else:
+            print(f"删除歌单失败 (ID: {playlist_id})")
+            if log_func:
+                log_func(f"删除歌单失败 (ID: {playlist_id})")
+            return False
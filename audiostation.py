@@ -1,38 +1,97 @@
 import re
+import time
+import threading
 import requests
-import json
-from fuzzywuzzy import fuzz
-from tqdm import tqdm
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from song_index import SongIndex, iter_match_parallel
+from transport import SynologyTransport, connection_not_made
+from library_cache import (load_library_cache, save_library_cache, library_fingerprint,
+                           load_playlist_list_cache, save_playlist_list_cache)
+from match_cache import MatchCache, match_cache_path
+from metrics import metrics
+
+# 匹配路径及其在统计信息中的名称
+MATCH_PATH_NAMES = {
+    'exact': '精确匹配',
+    'title': '标题匹配',
+    'cache': '缓存命中',
+    'fuzzy': '模糊匹配',
+    'unmatched': '未匹配'
+}
+
+# 单首歌曲匹配耗时的直方图，按匹配路径区分
+MATCH_LATENCY_METRIC = 'match_latency_seconds'
+
+def parse_song_entry(line):
+    """
+    解析 "歌曲名 - 歌手" 格式的一行，返回 (title, artist)，格式无效时返回 None
+    """
+    match = re.match(r'^(.*?)\s*-\s*(.*)$', line)
+    if not match:
+        return None
+    return match.group(1).strip(), match.group(2).strip()
 
 class AudioStationClient:
-    def __init__(self, host, username, password, device_name='PythonPlayer'):
+    def __init__(self, host, username, password, device_name='PythonPlayer',
+                 shortlist_size=300, full_scan_fallback=True, parallel_workers=0):
         self.host = host.rstrip('/')
         self.username = username
         self.password = password
         self.device_name = device_name
-        self.session = requests.Session()
+        # 所有 WebAPI 请求共用的请求层：连接池、重试和调用耗时统计
+        self.transport = SynologyTransport(self.host, pool_size=16)
+        self.session = self.transport.session
         self.endpoints = {}
         self.sid = None
         self.did = None
         self.all_songs_cache = []
+        self.song_index = SongIndex()
+        # 加载本地缓存时在后台建立索引，匹配前等待该线程完成
+        self._index_thread = None
+        self._index_lock = threading.Lock()
+        # 模糊打分前通过倒排索引筛选的候选数量，0 或 None 表示始终全量比对
+        self.shortlist_size = shortlist_size
+        # 筛选结果为空时是否退回全量比对
+        self.full_scan_fallback = full_scan_fallback
+        # 批量匹配时每次送入得分矩阵计算的歌曲数
+        self.batch_size = 256
+        # 并行匹配的进程数，0 表示在当前线程中匹配
+        self.parallel_workers = parallel_workers
+        # 是否将歌曲库保存到本地，下次登录时直接加载
+        self.persist_cache = True
+        # 获取歌曲库时并发请求的页数，以及单页失败后的重试次数
+        self.fetch_workers = 4
+        self.page_retries = 2
+        # 导入时在同一次比对中同时按 "歌曲名 - 歌手" 和 "歌手 - 歌曲名" 打分
+        self.bidirectional_matching = True
+        # 匹配结果缓存，歌曲库指纹或匹配设置变化时自动作废
+        self.use_match_cache = True
+        self.match_cache = MatchCache(match_cache_path(self.host, self.username))
+        self.library_fingerprint = None
+        self._match_cache_loaded = False
+        # 最近一次导入中每种匹配路径处理的行数
+        self.match_stats = Counter()
+        # 向歌单添加歌曲时每块的歌曲数、单块重试次数和单次请求超时
+        self.add_chunk_size = 500
+        self.add_retries = 3
+        self.add_timeout = 30
+        # 各歌单已成功添加的块数，以及添加中断、可以继续的导入
+        self.add_progress = {}
+        self.pending_import = None
+        # 为 False 时不逐首输出匹配日志，只输出汇总和部分未匹配的歌曲
+        self.log_each_match = True
+        self.unmatched_log_limit = 20
 
     def get_available_endpoints(self):
-        url = f"{self.host}/webapi/query.cgi"
-        params = {
+        data = self._call_api("SYNO.API.Info", {
             "version": 1,
             "api": "SYNO.API.Info",
             "method": "query",
             "query": "all"
-        }
-        try:
-            response = self.session.get(url, params=params, verify=False, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-        except requests.RequestException as e:
-            print(f"获取可用端点请求失败: {e}")
-            return False
-        except json.JSONDecodeError:
-            print("无法解析 JSON 响应")
+        }, "获取可用端点", path="query.cgi", http_method='GET')
+        if data is None:
             return False
         if data.get('success'):
             self.endpoints = data['data']
@@ -41,14 +100,9 @@ class AudioStationClient:
             print("无法获取可用端点")
             return False
 
+    @metrics.stage('login')
     def login(self):
-        auth_info = self.endpoints.get("SYNO.API.Auth")
-        if not auth_info:
-            print("Auth 端点未找到")
-            return False
-        path = auth_info['path']
-        url = f"{self.host}/webapi/{path}"
-        payload = {
+        data = self._call_api("SYNO.API.Auth", {
             "version": 6,
             "api": "SYNO.API.Auth",
             "method": "login",
@@ -57,16 +111,8 @@ class AudioStationClient:
             "account": self.username,
             "passwd": self.password,
             "enable_device_token": "yes"
-        }
-        try:
-            response = self.session.post(url, data=payload, verify=False, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-        except requests.RequestException as e:
-            print(f"登录请求失败: {e}")
-            return False
-        except json.JSONDecodeError:
-            print("无法解析 JSON 响应")
+        }, "登录")
+        if data is None:
             return False
         if data.get('success'):
             self.sid = data['data']['sid']
@@ -80,72 +126,194 @@ class AudioStationClient:
             print("登录失败")
             return False
 
+    def _call_api(self, api, payload, action, log_func=None, path=None, http_method='POST',
+                  timeout=None, idempotent=True, errors=None):
+        """
+        统一调用 AudioStation WebAPI：查找端点、发送请求并解析 JSON
+        端点缺失、请求或解析失败时输出错误信息并返回 None，成功时返回响应 JSON
+        errors: 传入列表时，请求失败的异常会追加到其中，供调用方区分失败原因
+        """
+        if path is None:
+            api_info = self.endpoints.get(api)
+            if not api_info:
+                print(f"{api.rsplit('.', 1)[-1]} 端点未找到")
+                if log_func:
+                    log_func(f"{api.rsplit('.', 1)[-1]} 端点未找到")
+                return None
+            path = api_info['path']
+        try:
+            return self.transport.call(
+                path, payload, f"{api}.{payload.get('method')}",
+                http_method=http_method, timeout=timeout, idempotent=idempotent
+            )
+        except requests.RequestException as e:
+            if errors is not None:
+                errors.append(e)
+            print(f"{action}请求失败: {e}")
+            if log_func:
+                log_func(f"{action}请求失败: {e}")
+        except ValueError as e:
+            if errors is not None:
+                errors.append(e)
+            print("无法解析 JSON 响应")
+            if log_func:
+                log_func("无法解析 JSON 响应")
+        return None
+
+    @metrics.stage('fetch_library')
     def fetch_all_songs(self, log_func=None):
         """
         获取服务器上所有歌曲并缓存到 self.all_songs_cache
         """
-        song_info = self.endpoints.get("SYNO.AudioStation.Song")
-        if not song_info:
-            print("Song 端点未找到")
-            if log_func:
-                log_func("Song 端点未找到")
-            return False
-        path = song_info['path']
-        url = f"{self.host}/webapi/{path}"
-        offset = 0
+        songs_cache = []
+        for songs in self.iter_song_pages(log_func):
+            if songs is None:
+                return False
+            songs_cache.extend(songs)
+        self._store_songs_cache(songs_cache, log_func)
+        return True
+
+    def iter_song_pages(self, log_func=None):
+        """
+        按顺序逐页产出服务器上的歌曲，第一页之后的页面并发获取
+        获取失败时产出 None 并结束
+        """
         limit = 500
-        total = None
         if log_func:
             log_func("正在获取所有歌曲并缓存...")
-        while True:
-            params = {
-                "version": 3,
-                "api": "SYNO.AudioStation.Song",
-                "method": "list",
-                "library": "all",
-                "offset": offset,
-                "limit": limit,
-                "additional": "song_tag,song_audio,song_rating",
-                "_sid": self.sid
-            }
+
+        first_page = self._fetch_song_page(0, limit, log_func)
+        if first_page is None:
+            yield None
+            return
+        total = first_page.get('total', 0)
+        if log_func:
+            log_func(f"总歌曲数: {total}")
+        songs = first_page.get('songs', [])
+        fetched = len(songs)
+        if log_func:
+            log_func(f"已缓存 {fetched}/{total} 首歌曲。")
+        yield songs
+
+        # 服务器单页上限可能小于 limit，以第一页实际返回的数量作为步长
+        step = fetched or limit
+        offsets = range(fetched, total, step) if fetched else []
+        with ThreadPoolExecutor(max_workers=self.fetch_workers) as executor:
+            futures = [executor.submit(self._fetch_song_page, offset, step, log_func) for offset in offsets]
             try:
-                response = self.session.get(url, params=params, verify=False, timeout=10)
-                response.raise_for_status()
-                data = response.json()
-            except requests.RequestException as e:
-                print(f"获取歌曲列表请求失败: {e}")
-                if log_func:
-                    log_func(f"获取歌曲列表请求失败: {e}")
-                return False
-            except json.JSONDecodeError:
-                print("无法解析 JSON 响应")
-                if log_func:
-                    log_func("无法解析 JSON 响应")
-                return False
-            if data.get('success'):
-                songs = data['data'].get('songs', [])
-                if total is None:
-                    total = data['data'].get('total', 0)
+                for future in futures:
+                    page = future.result()
+                    if page is None:
+                        yield None
+                        return
+                    songs = page.get('songs', [])
+                    fetched += len(songs)
                     if log_func:
-                        log_func(f"总歌曲数: {total}")
-                if not songs:
-                    break
-                self.all_songs_cache.extend(songs)
-                offset += len(songs)
-                if log_func:
-                    log_func(f"已缓存 {len(self.all_songs_cache)}/{total} 首歌曲。")
-                if offset >= total:
-                    break
-            else:
-                print("获取歌曲列表失败")
-                if log_func:
-                    log_func("获取歌曲列表失败")
-                return False
+                        log_func(f"已缓存 {fetched}/{total} 首歌曲。")
+                    yield songs
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def _store_songs_cache(self, songs_cache, log_func=None, song_index=None):
+        """
+        保存获取到的完整歌曲库：替换缓存、重建索引并写入本地缓存文件
+        song_index: 已按相同顺序建好的索引，传入时直接使用
+        """
+        self.set_songs_cache(songs_cache, song_index)
         print(f"成功缓存 {len(self.all_songs_cache)} 首歌曲。")
         if log_func:
             log_func(f"成功缓存 {len(self.all_songs_cache)} 首歌曲。")
+        if self.persist_cache:
+            save_library_cache(self.host, self.username, self.all_songs_cache)
+
+    def _fetch_song_page(self, offset, limit, log_func=None):
+        """
+        获取一页歌曲，返回接口的 data 字段
+        网络错误和 5xx 由请求层重试，接口返回失败或端点缺失时单独重试该页，仍失败返回 None
+        """
+        params = {
+            "version": 3,
+            "api": "SYNO.AudioStation.Song",
+            "method": "list",
+            "library": "all",
+            "offset": offset,
+            "limit": limit,
+            "additional": "song_tag,song_audio,song_rating",
+            "_sid": self.sid
+        }
+        for attempt in range(self.page_retries + 1):
+            if attempt:
+                time.sleep(attempt)
+                if log_func:
+                    log_func(f"重试获取歌曲列表 (offset={offset}, 第 {attempt} 次)")
+            data = self._call_api("SYNO.AudioStation.Song", params, "获取歌曲列表", log_func, http_method='GET')
+            if data is None:
+                if "SYNO.AudioStation.Song" not in self.endpoints:
+                    return None
+                continue
+            if data.get('success'):
+                return data['data']
+            print("获取歌曲列表失败")
+            if log_func:
+                log_func("获取歌曲列表失败")
+        return None
+
+    def load_cached_songs(self, log_func=None):
+        """
+        从本地缓存加载歌曲库，成功返回 True，之后可在后台调用 fetch_all_songs 刷新
+        匹配索引在后台线程中建立，登录后可以先进入主界面
+        """
+        songs, saved_at = load_library_cache(self.host, self.username)
+        if not songs:
+            return False
+        self.set_songs_cache(songs, background=True)
+        saved_time = time.strftime('%Y-%m-%d %H:%M', time.localtime(saved_at)) if saved_at else '未知时间'
+        print(f"已加载本地缓存的 {len(songs)} 首歌曲 (保存于 {saved_time})。")
+        if log_func:
+            log_func(f"已加载本地缓存的 {len(songs)} 首歌曲 (保存于 {saved_time})。")
         return True
 
+    def set_songs_cache(self, songs, song_index=None, background=False):
+        """
+        替换歌曲缓存并重建匹配索引，song_index 为已按相同顺序建好的索引时直接使用
+        background 为 True 时立即替换缓存，索引在后台线程中建立，匹配前会等待其完成
+        """
+        if song_index is None and background:
+            thread = threading.Thread(target=self._build_song_index, args=(songs,), daemon=True)
+            with self._index_lock:
+                self.all_songs_cache = songs
+                self._index_thread = thread
+            thread.start()
+            return
+        # 先建好索引再替换，后台刷新时正在进行的匹配不会看到不一致的缓存
+        if song_index is None:
+            song_index = SongIndex(songs)
+        fingerprint = library_fingerprint(songs)
+        with self._index_lock:
+            self.all_songs_cache = songs
+            self.song_index = song_index
+            self.library_fingerprint = fingerprint
+            self._index_thread = None
+
+    def _build_song_index(self, songs):
+        """
+        在后台线程中为 songs 建立索引，建立期间歌曲缓存已被替换时丢弃结果
+        """
+        song_index = SongIndex(songs)
+        fingerprint = library_fingerprint(songs)
+        with self._index_lock:
+            if self.all_songs_cache is songs:
+                self.song_index = song_index
+                self.library_fingerprint = fingerprint
+
+    def rebuild_song_index(self):
+        """
+        根据 self.all_songs_cache 重建匹配索引，缓存变化后调用
+        """
+        self.song_index = SongIndex(self.all_songs_cache)
+        self.library_fingerprint = library_fingerprint(self.all_songs_cache)
+
     def match_song(self, title, artist, threshold=70, log_func=None):
         """
         使用模糊匹配在缓存中搜索歌曲，返回最佳匹配的歌曲 ID
@@ -157,72 +325,193 @@ class AudioStationClient:
                 log_func("歌曲缓存为空，无法进行匹配。")
             return None, 0
 
-        candidates = [
-            {
-                "id": song['id'],
-                "title": song.get('title', '').lower(),
-                "artist": song.get('additional', {}).get('song_tag', {}).get('artist', '').lower()
-            }
-            for song in self.all_songs_cache
-        ]
+        start = time.perf_counter()
+        song_index = self._current_song_index()
+        match_cache = self._current_match_cache()
+        fast = self._fast_lookup(song_index, match_cache, title, artist, threshold)
+        if fast:
+            song_id, score, path = fast
+            metrics.observe(MATCH_LATENCY_METRIC, time.perf_counter() - start, label=path)
+            return self._match_result(title, artist, song_id, score, threshold, log_func)
 
-        input_title = title.strip().lower()
-        input_artists = re.split(r'[、/，,]', artist.lower())
+        best_pos, highest_score = song_index.match(
+            title, artist,
+            shortlist_size=self.shortlist_size,
+            full_scan_fallback=self.full_scan_fallback
+        )
 
-        best_match = None
-        highest_score = 0
+        song_id = song_index.ids[best_pos] if best_pos is not None else None
+        if match_cache is not None:
+            match_cache.put(title, artist, song_id, highest_score)
+        metrics.observe(MATCH_LATENCY_METRIC, time.perf_counter() - start, label='fuzzy')
+        return self._match_result(title, artist, song_id, highest_score, threshold, log_func)
+
+    def match_songs(self, entries, threshold=70, log_func=None, paths=None, bidirectional=False,
+                    progress_func=None, cancel_event=None):
+        """
+        批量匹配 [(title, artist), ...]，返回与输入顺序一致的 [(歌曲 ID, 得分), ...]
+        安装了 rapidfuzz 和 numpy 时整块计算得分矩阵，得分和阈值规则与 match_song 相同
+        paths: 传入列表时依次填入每首歌曲的匹配路径 ('exact'、'title'、'cache' 或 'fuzzy')
+        bidirectional: 在同一次比对中同时尝试 "歌手 - 歌曲名" 的理解方式
+        progress_func: 每完成一块调用 progress_func('match', 已完成数, 总数)
+        cancel_event: 被设置时在块之间停止匹配并返回 None
+        """
+        if not self.all_songs_cache:
+            print("歌曲缓存为空，无法进行匹配。")
+            if log_func:
+                log_func("歌曲缓存为空，无法进行匹配。")
+            return [(None, 0)] * len(entries)
+
+        song_index = self._current_song_index()
+        match_cache = self._current_match_cache()
+        results = [None] * len(entries)
+        entry_paths = ['fuzzy'] * len(entries)
+        misses = []
+        for i, (title, artist) in enumerate(entries):
+            start = time.perf_counter()
+            fast = self._fast_lookup(song_index, match_cache, title, artist, threshold, bidirectional)
+            if fast:
+                song_id, score, entry_paths[i] = fast
+                results[i] = self._match_result(title, artist, song_id, score, threshold, log_func)
+                metrics.observe(MATCH_LATENCY_METRIC, time.perf_counter() - start, label=entry_paths[i])
+            else:
+                misses.append(i)
+        if paths is not None:
+            paths.extend(entry_paths)
+
+        miss_entries = [entries[i] for i in misses]
+        done = 0
+        if progress_func:
+            progress_func('match', len(entries) - len(misses), len(entries))
+        # 进度条只在命令行下显示，传入 log_func（图形界面）时不加载 tqdm
+        progress = None
+        if log_func is None:
+            from tqdm import tqdm
+            progress = tqdm(total=len(miss_entries), desc="Matching songs", unit="song")
+        try:
+            # 整块打分，块内每首歌曲的耗时按平均值计入直方图
+            start = time.perf_counter()
+            for count, matches in self._iter_batch_matches(song_index, miss_entries, bidirectional):
+                for i, (best_pos, score) in zip(misses[done:done + count], matches):
+                    title, artist = entries[i]
+                    song_id = song_index.ids[best_pos] if best_pos is not None else None
+                    if match_cache is not None:
+                        match_cache.put(title, artist, song_id, score, bidirectional)
+                    results[i] = self._match_result(title, artist, song_id, score, threshold, log_func)
+                if count:
+                    metrics.observe(MATCH_LATENCY_METRIC, (time.perf_counter() - start) / count, count, label='fuzzy')
+                done += count
+                if progress is not None:
+                    progress.update(count)
+                if progress_func:
+                    progress_func('match', len(entries) - len(misses) + done, len(entries))
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                start = time.perf_counter()
+        finally:
+            if progress is not None:
+                progress.close()
+        return results
+
+    def _fast_lookup(self, song_index, match_cache, title, artist, threshold, bidirectional=False):
+        """
+        模糊打分前的快速路径：先查精确匹配哈希表，再查匹配结果缓存
+        命中时返回 (歌曲 ID, 得分, 路径)，否则返回 None
+        """
+        exact = song_index.exact_match(title, artist, threshold)
+        if not exact and bidirectional:
+            exact = song_index.exact_match(artist, title, threshold)
+        if exact:
+            pos, score, path = exact
+            return song_index.ids[pos], score, path
+        cached = match_cache.get(title, artist, bidirectional) if match_cache is not None else None
+        if cached:
+            return cached[0], cached[1], 'cache'
+        return None
+
+    def _iter_batch_matches(self, song_index, entries, bidirectional=False):
+        """
+        按输入顺序逐块产出 (块内歌曲数, [(位置, 得分), ...])，开启并行时交给进程池计算
+        """
+        if self.parallel_workers and len(entries) > self.batch_size:
+            yield from iter_match_parallel(
+                song_index, entries, self.parallel_workers,
+                chunk_size=self.batch_size,
+                shortlist_size=self.shortlist_size,
+                full_scan_fallback=self.full_scan_fallback,
+                bidirectional=bidirectional
+            )
+            return
+        for start in range(0, len(entries), self.batch_size):
+            batch = entries[start:start + self.batch_size]
+            yield len(batch), song_index.match_batch(
+                batch,
+                shortlist_size=self.shortlist_size,
+                full_scan_fallback=self.full_scan_fallback,
+                bidirectional=bidirectional
+            )
+
+    def _current_song_index(self):
+        """
+        返回与歌曲缓存一致的索引，匹配期间使用同一个索引对象，后台刷新替换索引不影响本次匹配
+        """
+        thread = self._index_thread
+        if thread is not None:
+            thread.join()
+        song_index = self.song_index
+        if len(song_index) != len(self.all_songs_cache):
+            self.rebuild_song_index()
+            song_index = self.song_index
+        return song_index
 
-        for song in candidates:
-            title_score = fuzz.token_set_ratio(input_title, song['title'])
-            artist_score = max(fuzz.token_set_ratio(a.strip(), song['artist']) for a in input_artists)
-            combined_score = (title_score * 0.7) + (artist_score * 0.3)
+    def _current_match_cache(self):
+        """
+        返回与当前歌曲库和匹配设置一致的匹配结果缓存，未启用时返回 None
+        """
+        if not self.use_match_cache or not self.library_fingerprint:
+            return None
+        if not self._match_cache_loaded:
+            self.match_cache.load()
+            self._match_cache_loaded = True
+        self.match_cache.validate(f"{self.library_fingerprint}:{self.shortlist_size}:{self.full_scan_fallback}")
+        return self.match_cache
 
-            if combined_score > highest_score:
-                highest_score = combined_score
-                best_match = song
+    def save_match_cache(self):
+        """
+        将匹配结果缓存写入本地文件
+        """
+        if self.use_match_cache and self.persist_cache:
+            self.match_cache.save()
 
-        if best_match and highest_score >= threshold:
+    def _match_result(self, title, artist, song_id, score, threshold, log_func=None):
+        """
+        根据最佳匹配的歌曲和得分生成 (歌曲 ID, 得分) 并记录日志，未达到阈值时歌曲 ID 为 None
+        """
+        if not self.log_each_match:
+            log_func = None
+        if song_id is not None and score >= threshold:
             if log_func:
-                log_func(f"匹配成功: {title} - {artist} (得分: {highest_score:.2f})")
-            return best_match['id'], highest_score
+                log_func(f"匹配成功: {title} - {artist} (得分: {score:.2f})")
+            return song_id, score
         else:
             if log_func:
-                log_func(f"匹配失败: {title} - {artist} (最佳得分: {highest_score:.2f})")
-            return None, highest_score
+                log_func(f"匹配失败: {title} - {artist} (最佳得分: {score:.2f})")
+            return None, score
 
+    @metrics.stage('create_playlist')
     def create_playlist(self, name, log_func=None):
         """
         创建一个新的播放列表，返回其 ID
         """
-        playlist_info = self.endpoints.get("SYNO.AudioStation.Playlist")
-        if not playlist_info:
-            print("Playlist 端点未找到")
-            if log_func:
-                log_func("Playlist 端点未找到")
-            return None
-        path = playlist_info['path']
-        url = f"{self.host}/webapi/{path}"
-        payload = {
+        data = self._call_api("SYNO.AudioStation.Playlist", {
             "version": 2,
             "api": "SYNO.AudioStation.Playlist",
             "method": "create",
             "library": "personal",
             "name": name,
             "_sid": self.sid
-        }
-        try:
-            response = self.session.post(url, data=payload, verify=False, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-        except requests.RequestException as e:
-            print(f"创建歌单请求失败: {e}")
-            if log_func:
-                log_func(f"创建歌单请求失败: {e}")
-            return None
-        except json.JSONDecodeError:
-            print("无法解析 JSON 响应")
-            if log_func:
-                log_func("无法解析 JSON 响应")
+        }, "创建歌单", log_func, idempotent=False)
+        if data is None:
             return None
         if data.get('success'):
             playlist_id = data['data']['id']
@@ -236,19 +525,141 @@ class AudioStationClient:
                 log_func(f"创建歌单失败: {name}")
             return None
 
-    def add_songs_to_playlist(self, playlist_id, song_ids, log_func=None):
+    @metrics.stage('add_songs')
+    def add_songs_to_playlist(self, playlist_id, song_ids, log_func=None, resume=True,
+                              progress_func=None, cancel_event=None):
         """
-        将歌曲添加到指定的播放列表
+        将歌曲按顺序分块追加到指定的播放列表，每块失败时单独重试
+        追加不是幂等操作：请求可能已送达服务器时，先读回歌单的歌曲数确认这一块是否已添加，再决定是否重新发送
+        某一块重试后仍失败时返回 False，已成功的块数记录在 self.add_progress 中，
+        resume 为 True 时再次调用会从第一个未成功的块继续
+        progress_func: 每添加一块调用 progress_func('add', 已添加数, 总数)
+        cancel_event: 被设置时在块之间停止添加并返回 False，之后同样可以从中断处继续
         """
-        playlist_info = self.endpoints.get("SYNO.AudioStation.Playlist")
-        if not playlist_info:
+        if "SYNO.AudioStation.Playlist" not in self.endpoints:
             print("Playlist 端点未找到")
             if log_func:
                 log_func("Playlist 端点未找到")
             return False
-        path = playlist_info['path']
-        url = f"{self.host}/webapi/{path}"
-        payload = {
+
+        chunk_size = max(1, self.add_chunk_size)
+        chunks = [song_ids[i:i + chunk_size] for i in range(0, len(song_ids), chunk_size)]
+        start = self.add_progress.get(playlist_id, 0) if resume else 0
+        if start:
+            print(f"从第 {start + 1}/{len(chunks)} 块继续添加歌曲 (ID: {playlist_id})")
+            if log_func:
+                log_func(f"从第 {start + 1}/{len(chunks)} 块继续添加歌曲 (ID: {playlist_id})")
+        # 添加每一块之前歌单中应有的歌曲数，无法读取时为 None，此时不能确认超时的块是否已添加
+        count = self._playlist_song_count(playlist_id, log_func)
+
+        # 追加 (offset=-1) 依赖请求顺序，各块依次发送以保持歌单中的歌曲顺序
+        for n in range(start, len(chunks)):
+            if cancel_event is not None and cancel_event.is_set():
+                print(f"已取消添加歌曲，已添加前 {n} 块 (ID: {playlist_id})")
+                if log_func:
+                    log_func(f"已取消添加歌曲，已添加前 {n} 块 (ID: {playlist_id})")
+                return False
+            chunk = chunks[n]
+            if not self._add_playlist_chunk(playlist_id, chunk, count, f"{n + 1}/{len(chunks)}", log_func):
+                landed = sum(len(c) for c in chunks[:n])
+                print(f"第 {n + 1}/{len(chunks)} 块添加失败，已成功添加前 {n} 块共 {landed} 首歌曲 (ID: {playlist_id})")
+                if log_func:
+                    log_func(f"第 {n + 1}/{len(chunks)} 块添加失败，已成功添加前 {n} 块共 {landed} 首歌曲 (ID: {playlist_id})")
+                return False
+            self.add_progress[playlist_id] = n + 1
+            if count is not None:
+                count += len(chunk)
+            if progress_func:
+                progress_func('add', min((n + 1) * chunk_size, len(song_ids)), len(song_ids))
+            if log_func and len(chunks) > 1:
+                log_func(f"已添加第 {n + 1}/{len(chunks)} 块 ({len(chunk)} 首歌曲)")
+
+        self.add_progress.pop(playlist_id, None)
+        print(f"成功添加 {len(song_ids)} 首歌曲到歌单 (ID: {playlist_id})")
+        if log_func:
+            log_func(f"成功添加 {len(song_ids)} 首歌曲到歌单 (ID: {playlist_id})")
+        return True
+
+    def _add_playlist_chunk(self, playlist_id, chunk, count, label, log_func=None):
+        """
+        追加一块歌曲，失败时按指数退避重试，count 为添加前歌单中的歌曲数
+        连接未建立的请求直接重新发送；其他失败（如超时）时服务器可能已经追加了这一块，
+        先读回歌曲数：等于 count 才重新发送，等于 count 加块大小则视为已添加，无法确认时不重新发送
+        """
+        unconfirmed = False
+        for attempt in range(self.add_retries + 1):
+            if attempt:
+                time.sleep(2 ** (attempt - 1))
+            if unconfirmed:
+                landed = self._chunk_landed(playlist_id, count, len(chunk), label, log_func)
+                if landed:
+                    return True
+                if landed is None:
+                    continue
+                unconfirmed = False
+            if attempt and log_func:
+                log_func(f"重试添加第 {label} 块 (第 {attempt} 次)")
+            result = self._append_playlist_songs(playlist_id, chunk, log_func)
+            if result:
+                return True
+            unconfirmed = result is False
+        # 最后一次发送失败时同样要确认，避免继续导入时重复添加
+        return bool(unconfirmed and self._chunk_landed(playlist_id, count, len(chunk), label, log_func))
+
+    def _chunk_landed(self, playlist_id, count, size, label, log_func=None):
+        """
+        读回歌单的歌曲数，判断添加前有 count 首歌曲的歌单是否已追加了 size 首
+        已追加返回 True，未追加返回 False，无法读取或歌曲数与两者都不符时返回 None
+        """
+        if count is None:
+            return None
+        current = self._playlist_song_count(playlist_id, log_func)
+        if current == count + size:
+            print(f"第 {label} 块已添加到歌单 (ID: {playlist_id})")
+            if log_func:
+                log_func(f"第 {label} 块已添加到歌单 (ID: {playlist_id})")
+            return True
+        if current == count:
+            return False
+        if current is not None:
+            print(f"歌单中的歌曲数 ({current}) 与预期不符，无法确认第 {label} 块是否已添加 (ID: {playlist_id})")
+            if log_func:
+                log_func(f"歌单中的歌曲数 ({current}) 与预期不符，无法确认第 {label} 块是否已添加 (ID: {playlist_id})")
+        return None
+
+    def _playlist_song_count(self, playlist_id, log_func=None):
+        """
+        获取歌单中当前的歌曲数，失败时返回 None
+        """
+        data = self._call_api("SYNO.AudioStation.Playlist", {
+            "version": 2,
+            "api": "SYNO.AudioStation.Playlist",
+            "method": "getinfo",
+            "id": playlist_id,
+            "library": "personal",
+            "additional": "songs",
+            "_sid": self.sid
+        }, "获取歌单信息", log_func)
+        if data is None:
+            return None
+        playlists = data.get('data', {}).get('playlists') if data.get('success') else None
+        if not playlists:
+            print(f"获取歌单信息失败 (ID: {playlist_id})")
+            if log_func:
+                log_func(f"获取歌单信息失败 (ID: {playlist_id})")
+            return None
+        additional = playlists[0].get('additional', {})
+        total = additional.get('songs_total')
+        return total if total is not None else len(additional.get('songs', []))
+
+    def _append_playlist_songs(self, playlist_id, song_ids, log_func=None):
+        """
+        发送一次 updatesongs 请求，将一块歌曲追加到歌单末尾
+        成功返回 True；连接未建立、请求没有送达时返回 None；
+        其他失败返回 False，此时服务器可能已经追加了这些歌曲
+        """
+        errors = []
+        data = self._call_api("SYNO.AudioStation.Playlist", {
             "version": 2,
             "api": "SYNO.AudioStation.Playlist",
             "method": "updatesongs",
@@ -257,25 +668,10 @@ class AudioStationClient:
             "limit": 0,
             "songs": ",".join(song_ids),
             "_sid": self.sid
-        }
-        try:
-            response = self.session.post(url, data=payload, verify=False, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-        except requests.RequestException as e:
-            print(f"添加歌曲到歌单请求失败: {e}")
-            if log_func:
-                log_func(f"添加歌曲到歌单请求失败: {e}")
-            return False
-        except json.JSONDecodeError:
-            print("无法解析 JSON 响应")
-            if log_func:
-                log_func("无法解析 JSON 响应")
-            return False
+        }, "添加歌曲到歌单", log_func, timeout=self.add_timeout, idempotent=False, errors=errors)
+        if data is None:
+            return None if errors and connection_not_made(errors[-1]) else False
         if data.get('success'):
-            print(f"成功添加 {len(song_ids)} 首歌曲到歌单 (ID: {playlist_id})")
-            if log_func:
-                log_func(f"成功添加 {len(song_ids)} 首歌曲到歌单 (ID: {playlist_id})")
             return True
         else:
             print(f"添加歌曲到歌单失败 (ID: {playlist_id})")
@@ -283,53 +679,26 @@ class AudioStationClient:
                 log_func(f"添加歌曲到歌单失败 (ID: {playlist_id})")
             return False
 
-    def import_playlist_from_song_list(self, song_list, playlist_name, threshold=70, log_func=None):
+    def import_playlist_from_song_list(self, song_list, playlist_name, threshold=70, log_func=None,
+                                       progress_func=None, cancel_event=None):
         """
         从歌曲列表导入歌单并创建新的播放列表
+        progress_func 和 cancel_event 的含义见 match_songs 和 add_songs_to_playlist
         """
-        song_ids = []
-        if log_func:
-            log_func("正在匹配歌曲...")
-        for song in tqdm(song_list, desc="Matching songs", unit="song"):
-            match = re.match(r'^(.*?)\s*-\s*(.*)$', song)
-            if not match:
+        song_entries = []
+        for song in song_list:
+            entry = parse_song_entry(song)
+            if not entry:
                 if log_func:
                     log_func(f"无效的歌曲格式: {song}")
                 continue
-            title = match.group(1).strip()
-            artist = match.group(2).strip()
-            song_id, score = self.match_song(title, artist, threshold, log_func)
-            if song_id:
-                song_ids.append(song_id)
-                continue
-            song_id, score = self.match_song(artist, title, threshold, log_func)
-            if song_id:
-                song_ids.append(song_id)
-                continue
-            if log_func:
-                log_func(f"未匹配到歌曲: {title} - {artist}")
+            song_entries.append(entry)
 
-        if not song_ids:
-            if log_func:
-                log_func("没有找到任何匹配的歌曲")
-            return False
+        return self._import_song_entries(song_entries, playlist_name, threshold, log_func,
+                                         progress_func, cancel_event)
 
-        new_playlist_id = self.create_playlist(playlist_name, log_func)
-        if not new_playlist_id:
-            if log_func:
-                log_func("无法创建新的播放列表")
-            return False
-
-        if self.add_songs_to_playlist(new_playlist_id, song_ids, log_func):
-            if log_func:
-                log_func(f"歌单 '{playlist_name}' 导入完成，共添加 {len(song_ids)} 首歌曲。")
-            return True
-        else:
-            if log_func:
-                log_func("添加歌曲到歌单时发生错误")
-            return False
-
-    def import_playlist_from_file(self, file_path, playlist_name, threshold=70, log_func=None):
+    def import_playlist_from_file(self, file_path, playlist_name, threshold=70, log_func=None,
+                                  progress_func=None, cancel_event=None):
         """
         从指定的文本文件导入歌单并创建新的播放列表
         """
@@ -347,11 +716,9 @@ class AudioStationClient:
             line = line.strip()
             if not line:
                 continue
-            match = re.match(r'^(.*?)\s*-\s*(.*)$', line)
-            if match:
-                title = match.group(1).strip()
-                artist = match.group(2).strip()
-                song_entries.append((title, artist))
+            entry = parse_song_entry(line)
+            if entry:
+                song_entries.append(entry)
             else:
                 if log_func:
                     log_func(f"无效的格式: {line}")
@@ -361,51 +728,236 @@ class AudioStationClient:
                 log_func("没有有效的歌曲条目")
             return False
 
-        song_ids = []
+        return self._import_song_entries(song_entries, playlist_name, threshold, log_func,
+                                         progress_func, cancel_event)
+
+    @metrics.stage('match')
+    def match_song_entries(self, song_entries, threshold=70, log_func=None, progress_func=None, cancel_event=None):
+        """
+        匹配 [(title, artist), ...]，同时考虑 "歌手 - 歌曲名" 的写法
+        开启 bidirectional_matching 时两种方向在同一次比对中打分，否则正向匹配失败的条目再反向匹配一次
+        歌曲缓存为空时边获取歌曲库边匹配
+        返回匹配到的歌曲 ID 列表，顺序与输入一致，被 cancel_event 取消时返回空列表
+        """
         if log_func:
             log_func("正在匹配歌曲...")
-        for title, artist in tqdm(song_entries, desc="Matching songs", unit="song"):
-            song_id, score = self.match_song(title, artist, threshold, log_func)
-            if song_id:
-                song_ids.append(song_id)
-                continue
-            song_id, score = self.match_song(artist, title, threshold, log_func)
+        bidirectional = self.bidirectional_matching
+        paths = []
+        if not self.all_songs_cache and self.sid:
+            results = self.match_songs_streaming(song_entries, threshold, log_func, bidirectional,
+                                                 progress_func, cancel_event, paths)
+            if results is None and not (cancel_event is not None and cancel_event.is_set()):
+                print("获取歌曲库失败，无法匹配")
+                if log_func:
+                    log_func("获取歌曲库失败，无法匹配")
+                return []
+        else:
+            results = self.match_songs(song_entries, threshold, log_func, paths, bidirectional,
+                                       progress_func, cancel_event)
+        unmatched = [i for i, (song_id, _) in enumerate(results or []) if not song_id]
+        if unmatched and not bidirectional:
+            swapped_paths = []
+            swapped = self.match_songs([(song_entries[i][1], song_entries[i][0]) for i in unmatched], threshold, log_func, swapped_paths,
+                                       cancel_event=cancel_event)
+            if swapped is None:
+                results = None
+            else:
+                for i, result, path in zip(unmatched, swapped, swapped_paths):
+                    results[i] = result
+                    paths[i] = path
+
+        self.save_match_cache()
+        if results is None:
+            print("已取消匹配")
+            if log_func:
+                log_func("已取消匹配")
+            return []
+
+        # 按每行最终采用的匹配路径统计，未匹配的行单独计数
+        self.match_stats = Counter(
+            path if song_id else 'unmatched'
+            for (song_id, _), path in zip(results, paths)
+        )
+        summary = "，".join(f"{MATCH_PATH_NAMES[path]} {self.match_stats[path]}" for path in MATCH_PATH_NAMES)
+        print(f"匹配统计: {summary}")
+        if log_func:
+            log_func(f"匹配统计: {summary}")
+
+        song_ids = []
+        unmatched_logged = 0
+        for (title, artist), (song_id, score) in zip(song_entries, results):
             if song_id:
                 song_ids.append(song_id)
-                continue
-            if log_func:
+            elif log_func and (self.log_each_match or unmatched_logged < self.unmatched_log_limit):
                 log_func(f"未匹配到歌曲: {title} - {artist}")
+                unmatched_logged += 1
+        unmatched_count = len(song_entries) - len(song_ids)
+        if log_func and unmatched_count > unmatched_logged:
+            log_func(f"另有 {unmatched_count - unmatched_logged} 首歌曲未匹配。")
+        return song_ids
+
+    def match_songs_streaming(self, entries, threshold=70, log_func=None, bidirectional=False,
+                              progress_func=None, cancel_event=None, paths=None):
+        """
+        边获取歌曲库边匹配 [(title, artist), ...]，每收到一页就追加到同一个索引中，
+        并为尚未确认的条目查找按完整歌手名的精确匹配，命中的条目立即确认（之后的页面不会改变这一结果）。
+        歌曲库获取完成后写入缓存，其余条目按 match_songs 的规则与完整索引比对，结果与先获取再匹配一致。
+        paths: 传入列表时依次填入每首歌曲的匹配路径
+        返回 [(歌曲 ID, 得分), ...]，获取失败或被取消时返回 None
+        """
+        song_index = SongIndex()
+        results = [None] * len(entries)
+        entry_paths = ['fuzzy'] * len(entries)
+        pending = list(range(len(entries)))
+        songs_cache = []
+        # 获取歌曲库的过程（含其间的精确匹配）记为嵌套在 match 中的 fetch_library 阶段
+        with metrics.stage('fetch_library'):
+            for songs in self.iter_song_pages(log_func):
+                if songs is None or (cancel_event is not None and cancel_event.is_set()):
+                    return None
+                song_index.add_songs(songs)
+                songs_cache.extend(songs)
+                unresolved = []
+                for i in pending:
+                    start = time.perf_counter()
+                    title, artist = entries[i]
+                    exact = song_index.exact_full_match(title, artist, threshold)
+                    if exact:
+                        pos, score, entry_paths[i] = exact
+                        results[i] = self._match_result(title, artist, song_index.ids[pos], score, threshold, log_func)
+                        metrics.observe(MATCH_LATENCY_METRIC, time.perf_counter() - start, label=entry_paths[i])
+                    else:
+                        unresolved.append(i)
+                if log_func and len(unresolved) < len(pending):
+                    log_func(f"已提前确认 {len(entries) - len(unresolved)}/{len(entries)} 首歌曲。")
+                pending = unresolved
+                if progress_func:
+                    progress_func('match', len(entries) - len(pending), len(entries))
+            # 获取过程中建好的索引直接作为歌曲库索引，不再重建
+            self._store_songs_cache(songs_cache, log_func, song_index)
+
+        confirmed = len(entries) - len(pending)
+
+        def report_rest(stage, done, total):
+            progress_func(stage, confirmed + done, len(entries))
+
+        rest_paths = []
+        rest = self.match_songs([entries[i] for i in pending], threshold, log_func, rest_paths, bidirectional,
+                                report_rest if progress_func else None, cancel_event)
+        if rest is None:
+            return None
+        for i, result, path in zip(pending, rest, rest_paths):
+            results[i] = result
+            entry_paths[i] = path
+        if paths is not None:
+            paths.extend(entry_paths)
+        return results
+
+    def _import_song_entries(self, song_entries, playlist_name, threshold=70, log_func=None,
+                             progress_func=None, cancel_event=None):
+        """
+        匹配歌曲条目，创建新的播放列表并添加匹配到的歌曲
+        """
+        song_ids = self.match_song_entries(song_entries, threshold, log_func, progress_func, cancel_event)
+
+        if cancel_event is not None and cancel_event.is_set():
+            if log_func:
+                log_func(f"已取消导入歌单 '{playlist_name}'")
+            return False
 
         if not song_ids:
             if log_func:
                 log_func("没有找到任何匹配的歌曲")
             return False
 
-        new_playlist_id = self.create_playlist(playlist_name, log_func)
-        if not new_playlist_id:
+        # 上次同名同内容的导入在添加歌曲时中断，继续向原歌单添加剩余的块
+        pending = self.pending_import
+        if pending and pending['playlist_name'] == playlist_name and pending['song_ids'] == song_ids:
+            new_playlist_id = pending['playlist_id']
             if log_func:
-                log_func("无法创建新的播放列表")
-            return False
+                log_func(f"继续上次未完成的导入: {playlist_name} (ID: {new_playlist_id})")
+        else:
+            new_playlist_id = self.create_playlist(playlist_name, log_func)
+            if not new_playlist_id:
+                if log_func:
+                    log_func("无法创建新的播放列表")
+                return False
 
-        if self.add_songs_to_playlist(new_playlist_id, song_ids, log_func):
+        if self.add_songs_to_playlist(new_playlist_id, song_ids, log_func,
+                                      progress_func=progress_func, cancel_event=cancel_event):
+            self.pending_import = None
             if log_func:
                 log_func(f"歌单 '{playlist_name}' 导入完成，共添加 {len(song_ids)} 首歌曲。")
             return True
         else:
+            self.pending_import = {
+                "playlist_name": playlist_name,
+                "playlist_id": new_playlist_id,
+                "song_ids": song_ids
+            }
             if log_func:
-                log_func("添加歌曲到歌单时发生错误")
+                if cancel_event is not None and cancel_event.is_set():
+                    log_func(f"已取消导入歌单 '{playlist_name}'，重新导入同一歌单将从中断处继续。")
+                else:
+                    log_func("添加歌曲到歌单时发生错误，重新导入同一歌单将从中断处继续。")
             return False
 
-    def get_playlist_list(self):
+    def get_playlist_list(self, offset=0, limit=0):
         """
-        获取当前所有播放列表。
+        获取当前播放列表，limit 为 0 时一次获取全部。
         """
-        playlist_info = self.endpoints.get("SYNO.AudioStation.Playlist")
-        if not playlist_info:
-            print("Playlist 端点未找到")
+        data = self._fetch_playlist_page(offset, limit)
+        if data is None:
             return []
-        path = playlist_info['path']
-        url = f"{self.host}/webapi/{path}"
+        return data.get('playlists', [])
+
+    def iter_playlist_pages(self, page_size=100, log_func=None):
+        """
+        按 offset/limit 分页获取播放列表，按顺序逐页产出 [播放列表, ...]
+        获取失败时产出 None 并结束
+        """
+        offset = 0
+        seen = set()
+        while True:
+            data = self._fetch_playlist_page(offset, page_size, log_func)
+            if data is None:
+                yield None
+                return
+            playlists = data.get('playlists', [])
+            # 忽略分页参数的服务器每次都返回同一页，整页都已获取过时结束
+            page_ids = {playlist.get('id') for playlist in playlists}
+            if playlists and page_ids <= seen:
+                return
+            seen |= page_ids
+            if playlists:
+                yield playlists
+            offset += len(playlists)
+            if not playlists:
+                return
+            total = data.get('total')
+            if total is None:
+                # 服务器没有返回总数时读到不满一页为止，超过一页说明服务器忽略了分页参数
+                if len(playlists) != page_size:
+                    return
+            elif offset >= total:
+                return
+
+    def load_cached_playlists(self):
+        """
+        读取本地缓存的歌单列表，未启用缓存或没有缓存时返回 None
+        """
+        if not self.persist_cache:
+            return None
+        return load_playlist_list_cache(self.host, self.username)
+
+    def save_playlists_cache(self, playlists):
+        """
+        将完整获取到的歌单列表保存到本地
+        """
+        if self.persist_cache:
+            save_playlist_list_cache(self.host, self.username, playlists)
+
+    def _fetch_playlist_page(self, offset, limit, log_func=None):
         payload = {
             "version": 2,
             "api": "SYNO.AudioStation.Playlist",
@@ -413,55 +965,32 @@ class AudioStationClient:
             "library": "personal",
             "_sid": self.sid
         }
-        try:
-            response = self.session.post(url, data=payload, verify=False, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-        except requests.RequestException as e:
-            print(f"获取播放列表请求失败: {e}")
-            return []
-        except json.JSONDecodeError:
-            print("无法解析 JSON 响应")
-            return []
+        if limit:
+            payload["offset"] = offset
+            payload["limit"] = limit
+        data = self._call_api("SYNO.AudioStation.Playlist", payload, "获取播放列表", log_func)
+        if data is None:
+            return None
         if data.get('success'):
-            playlists = data['data'].get('playlists', [])
-            return playlists
+            return data['data']
         else:
             print("获取播放列表失败")
-            return []
+            if log_func:
+                log_func("获取播放列表失败")
+            return None
 
     def delete_playlist(self, playlist_id, log_func=None):
         """
         删除指定的播放列表。
         """
-        playlist_info = self.endpoints.get("SYNO.AudioStation.Playlist")
-        if not playlist_info:
-            print("Playlist 端点未找到")
-            if log_func:
-                log_func("Playlist 端点未找到")
-            return False
-        path = playlist_info['path']
-        url = f"{self.host}/webapi/{path}"
-        payload = {
+        data = self._call_api("SYNO.AudioStation.Playlist", {
             "version": 2,
             "api": "SYNO.AudioStation.Playlist",
             "method": "delete",
             "id": playlist_id,
             "_sid": self.sid
-        }
-        try:
-            response = self.session.post(url, data=payload, verify=False, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-        except requests.RequestException as e:
-            print(f"删除播放列表请求失败: {e}")
-            if log_func:
-                log_func(f"删除播放列表请求失败: {e}")
-            return False
-        except json.JSONDecodeError:
-            print("无法解析 JSON 响应")
-            if log_func:
-                log_func("无法解析 JSON 响应")
+        }, "删除播放列表", log_func, idempotent=False)
+        if data is None:
             return False
         if data.get('success'):
             print(f"成功删除歌单 ID: {playlist_id}")
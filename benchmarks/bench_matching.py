@@ -0,0 +1,194 @@
+"""
+匹配引擎基准测试。
+
+对 1k 到 200k 首歌曲的合成曲库，分别测量：
+- 建立索引的耗时
+- 批量匹配 (match_songs) 和逐首匹配 (match_song) 每秒匹配的歌曲数
+- 建立索引和批量匹配的内存峰值 (tracemalloc)
+- 不同阈值下的准确率
+
+结果写入 JSON 文件，--compare 可以与之前版本的结果对比。
+
+用法:
+    python benchmarks/bench_matching.py
+    python benchmarks/bench_matching.py --sizes 1000 10000 --queries 500 --output new.json --compare old.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 基准测试不读写用户的缓存目录
+os.environ.setdefault('TNOS_CACHE_DIR', tempfile.mkdtemp(prefix='tnos_bench_'))
+
+from audiostation import AudioStationClient, parse_song_entry
+from song_index import batch_matching_available, normalize_text
+from synthetic import make_library, make_queries
+
+DEFAULT_SIZES = [1000, 10000, 50000, 200000]
+DEFAULT_THRESHOLDS = [50, 60, 70, 80, 90]
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def make_client(parallel_workers=0):
+    client = AudioStationClient('http://benchmark.invalid', 'benchmark', '', parallel_workers=parallel_workers)
+    client.use_match_cache = False
+    client.persist_cache = False
+    client.log_each_match = False
+    return client
+
+def song_key(song):
+    return normalize_text(song['title']), normalize_text(song['additional']['song_tag']['artist'])
+
+def accuracy(results, expected_ids, songs_by_id, thresholds):
+    """
+    统计各阈值下的准确率。曲库中可能有标题和歌手完全相同的歌曲，匹配到其中任意一首都算正确。
+    """
+    report = {}
+    for threshold in thresholds:
+        correct = wrong = missed = rejected = 0
+        for (song_id, score), expected in zip(results, expected_ids):
+            accepted = song_id is not None and score >= threshold
+            if expected is None:
+                if accepted:
+                    wrong += 1
+                else:
+                    rejected += 1
+            elif not accepted:
+                missed += 1
+            elif song_id == expected or song_key(songs_by_id[song_id]) == song_key(songs_by_id[expected]):
+                correct += 1
+            else:
+                wrong += 1
+        total = len(expected_ids)
+        report[str(threshold)] = {
+            "accuracy": round((correct + rejected) / total, 4) if total else 0,
+            "correct": correct,
+            "wrong": wrong,
+            "missed": missed,
+            "rejected_missing": rejected
+        }
+    return report
+
+def bench_size(size, args):
+    songs = make_library(size, seed=args.seed)
+    songs_by_id = {song['id']: song for song in songs}
+    queries = make_queries(songs, args.queries, seed=args.seed + 1)
+    entries = [parse_song_entry(line) for line, _ in queries]
+    expected_ids = [expected for _, expected in queries]
+    result = {"size": size, "queries": len(entries)}
+
+    client = make_client(args.workers)
+    start = time.perf_counter()
+    client.set_songs_cache(songs)
+    result["index_build_s"] = round(time.perf_counter() - start, 4)
+
+    # 阈值取 0 得到每首歌的最佳结果和得分，再按不同阈值统计准确率
+    start = time.perf_counter()
+    batch_results = client.match_songs(entries, threshold=0, log_func=lambda message: None, bidirectional=True)
+    elapsed = time.perf_counter() - start
+    result["batch"] = {
+        "seconds": round(elapsed, 4),
+        "matches_per_s": round(len(entries) / elapsed, 1) if elapsed else None
+    }
+    result["accuracy"] = accuracy(batch_results, expected_ids, songs_by_id, args.thresholds)
+
+    sample = entries[:args.single_sample]
+    if sample:
+        start = time.perf_counter()
+        for title, artist in sample:
+            client.match_song(title, artist, threshold=0)
+        elapsed = time.perf_counter() - start
+        result["single"] = {
+            "songs": len(sample),
+            "seconds": round(elapsed, 4),
+            "matches_per_s": round(len(sample) / elapsed, 1) if elapsed else None
+        }
+
+    if args.memory:
+        tracemalloc.start()
+        client = make_client(args.workers)
+        client.set_songs_cache(songs)
+        _, index_peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        client.match_songs(entries, threshold=0, log_func=lambda message: None, bidirectional=True)
+        _, match_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["memory"] = {
+            "index_peak_mb": round(index_peak / 2 ** 20, 2),
+            "match_peak_mb": round(match_peak / 2 ** 20, 2)
+        }
+    return result
+
+def print_summary(results, baseline=None):
+    baseline_by_size = {item['size']: item for item in (baseline or {}).get('results', [])}
+    print(f"{'曲库':>8} {'建索引(s)':>10} {'批量(首/秒)':>12} {'逐首(首/秒)':>12} {'内存(MB)':>9} {'准确率@70':>9}")
+    for item in results:
+        memory = item.get('memory', {}).get('match_peak_mb', '-')
+        single = item.get('single', {}).get('matches_per_s', '-')
+        acc = item['accuracy'].get('70', {}).get('accuracy', '-')
+        line = (f"{item['size']:>8} {item['index_build_s']:>10} {item['batch']['matches_per_s']:>12} "
+                f"{single:>12} {memory:>9} {acc:>9}")
+        old = baseline_by_size.get(item['size'])
+        if old and old['batch'].get('matches_per_s'):
+            change = item['batch']['matches_per_s'] / old['batch']['matches_per_s'] - 1
+            line += f"  批量速度 {change:+.1%}"
+        print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="匹配引擎基准测试")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="曲库规模")
+    parser.add_argument('--queries', type=int, default=1000, help="每个规模的待匹配歌曲数")
+    parser.add_argument('--single-sample', type=int, default=100, help="逐首匹配 (match_song) 的歌曲数，0 表示跳过")
+    parser.add_argument('--thresholds', type=int, nargs='+', default=DEFAULT_THRESHOLDS, help="统计准确率的阈值")
+    parser.add_argument('--workers', type=int, default=0, help="并行匹配的进程数，0 表示不并行")
+    parser.add_argument('--seed', type=int, default=1, help="合成数据的随机种子")
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help="跳过内存峰值测量")
+    parser.add_argument('--output', help="结果文件，默认写入 benchmarks/results/")
+    parser.add_argument('--compare', help="与之前的结果文件对比")
+    args = parser.parse_args(argv)
+
+    report = {
+        "benchmark": "matching",
+        "created_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "batch_matching": batch_matching_available(),
+        "args": vars(args),
+        "results": []
+    }
+    for size in args.sizes:
+        print(f"正在测试 {size} 首歌曲的曲库...", file=sys.stderr)
+        report["results"].append(bench_size(size, args))
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"matching_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_summary(report["results"], baseline)
+    print(f"结果已保存到 {output}")
+
+if __name__ == '__main__':
+    main()
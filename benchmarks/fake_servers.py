@@ -0,0 +1,307 @@
+"""
+本地模拟服务器，用于在没有群晖和外网的环境下做端到端压力测试。
+
+一个 HTTP 服务同时模拟：
+- Synology WebAPI 中 AudioStationClient 用到的部分：query.cgi、Auth、Song.list、
+  Playlist create/updatesongs/getinfo/list/delete
+- 网易云音乐 /api/v6/playlist/detail 和 /api/v3/song/detail
+- QQ 音乐 /qzone/fcg-bin/fcg_ucc_getcdinfo_byids_cp.fcg
+
+延迟、错误率和数据规模由 FakeServerConfig 配置。平台歌单从曲库中抽取歌曲生成，
+其中 missing_ratio 比例的歌曲不在曲库中。
+
+单独运行时启动服务器并打印各平台的地址:
+    python benchmarks/fake_servers.py --port 8765 --library-size 50000 --latency 20
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import make_library
+
+# 网易云音乐歌单详情接口返回完整歌曲信息的数量上限
+NETEASE_TRACK_LIMIT = 1000
+class FakeServerConfig:
+    """
+    模拟服务器的配置。
+    latency: 每个请求的基础延迟（秒），jitter 为额外的随机延迟上限
+    error_rate: 读取类请求返回 503 的概率；write_error_rate: 创建歌单和添加歌曲返回 503 的概率
+    netease_size / qqmusic_size: 平台歌单的歌曲数，missing_ratio: 其中不在曲库中的比例
+    song_page_limit / qqmusic_page_limit: Song.list 和 QQ 音乐歌单接口单次最多返回的歌曲数
+    """
+    def __init__(self, library_size=10000, netease_size=1500, qqmusic_size=1500, latency=0.0, jitter=0.0,
+                 error_rate=0.0, write_error_rate=0.0, missing_ratio=0.1, song_page_limit=5000,
+                 qqmusic_page_limit=1000, seed=1):
+        self.library_size = library_size
+        self.netease_size = netease_size
+        self.qqmusic_size = qqmusic_size
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.write_error_rate = write_error_rate
+        self.missing_ratio = missing_ratio
+        self.song_page_limit = song_page_limit
+        self.qqmusic_page_limit = qqmusic_page_limit
+        self.seed = seed
+
+class FakeState:
+    """
+    服务器数据：曲库、平台歌单、AudioStation 歌单和请求计数。
+    """
+    def __init__(self, config):
+        self.config = config
+        self.library = make_library(config.library_size, seed=config.seed)
+        self.playlists = {}
+        self.next_playlist = 1
+        self.requests = {}
+        self.lock = threading.Lock()
+        self.rng = random.Random(config.seed)
+
+    def count(self, label):
+        with self.lock:
+            self.requests[label] = self.requests.get(label, 0) + 1
+
+    def external_tracks(self, platform, playlist_id, size):
+        """
+        按平台和歌单 ID 确定性地生成歌单中的歌曲 [(名称, [歌手, ...]), ...]。
+        """
+        rng = random.Random(f"{platform}:{playlist_id}:{self.config.seed}")
+        tracks = []
+        for i in range(size):
+            if rng.random() < self.config.missing_ratio:
+                tracks.append((f"Missing Song {playlist_id}-{i}", [f"Nobody {i}"]))
+                continue
+            song = rng.choice(self.library)
+            artists = song['additional']['song_tag']['artist'].replace('、', '/').replace(',', '/').split('/')
+            tracks.append((song['title'], [a.strip() for a in artists if a.strip()]))
+        return tracks
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.handle_request()
+
+    def do_POST(self):
+        self.handle_request()
+
+    def read_params(self):
+        parsed = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            body = self.rfile.read(length).decode('utf-8')
+            params.update({key: values[0] for key, values in parse_qs(body).items()})
+        return parsed.path, params
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_request(self):
+        state = self.state
+        config = state.config
+        path, params = self.read_params()
+        if config.latency or config.jitter:
+            time.sleep(config.latency + random.random() * config.jitter)
+
+        if path.startswith('/webapi/'):
+            label = f"{params.get('api')}.{params.get('method')}"
+            handler = self.handle_synology
+        elif path == '/api/v6/playlist/detail':
+            label, handler = 'netease.playlist_detail', self.handle_netease_playlist
+        elif path == '/api/v3/song/detail':
+            label, handler = 'netease.song_detail', self.handle_netease_songs
+        elif path.endswith('fcg_ucc_getcdinfo_byids_cp.fcg'):
+            label, handler = 'qqmusic.cdinfo', self.handle_qqmusic
+        else:
+            self.send_json({"error": "not found"}, status=404)
+            return
+        state.count(label)
+
+        write = params.get('method') in ('create', 'updatesongs', 'delete')
+        if random.random() < (config.write_error_rate if write else config.error_rate):
+            state.count('injected_errors')
+            self.send_json({"error": "service unavailable"}, status=503)
+            return
+        self.send_json(handler(params))
+
+    def handle_synology(self, params):
+        state = self.state
+        api = params.get('api')
+        method = params.get('method')
+        if api == 'SYNO.API.Info':
+            return {"success": True, "data": {
+                "SYNO.API.Auth": {"path": "auth.cgi", "minVersion": 1, "maxVersion": 6},
+                "SYNO.AudioStation.Song": {"path": "AudioStation/song.cgi", "minVersion": 1, "maxVersion": 3},
+                "SYNO.AudioStation.Playlist": {"path": "AudioStation/playlist.cgi", "minVersion": 1, "maxVersion": 3}
+            }}
+        if api == 'SYNO.API.Auth':
+            return {"success": True, "data": {"sid": "fake-sid", "did": "fake-did"}}
+        if params.get('_sid') != 'fake-sid':
+            return {"success": False, "error": {"code": 119}}
+        if api == 'SYNO.AudioStation.Song' and method == 'list':
+            offset = int(params.get('offset', 0))
+            limit = min(int(params.get('limit', 0)) or state.config.song_page_limit, state.config.song_page_limit)
+            return {"success": True, "data": {
+                "offset": offset, "total": len(state.library), "songs": state.library[offset:offset + limit]
+            }}
+        if api == 'SYNO.AudioStation.Playlist':
+            with state.lock:
+                if method == 'create':
+                    playlist_id = f"playlist_personal_normal/{state.next_playlist}"
+                    state.next_playlist += 1
+                    state.playlists[playlist_id] = {"id": playlist_id, "name": params.get('name', ''), "songs": []}
+                    return {"success": True, "data": {"id": playlist_id}}
+                if method == 'updatesongs':
+                    playlist = state.playlists.get(params.get('id'))
+                    if playlist is None:
+                        return {"success": False, "error": {"code": 404}}
+                    playlist['songs'].extend(song for song in params.get('songs', '').split(',') if song)
+                    return {"success": True}
+                if method == 'getinfo':
+                    playlist = state.playlists.get(params.get('id'))
+                    if playlist is None:
+                        return {"success": False, "error": {"code": 404}}
+                    return {"success": True, "data": {"playlists": [{
+                        "id": playlist['id'], "name": playlist['name'],
+                        "additional": {"songs": [{"id": song} for song in playlist['songs']],
+                                       "songs_offset": 0, "songs_total": len(playlist['songs'])}
+                    }]}}
+                if method == 'list':
+                    playlists = list(state.playlists.values())
+                    offset = int(params.get('offset', 0))
+                    limit = int(params.get('limit', 0)) or len(playlists)
+                    return {"success": True, "data": {
+                        "offset": offset, "total": len(playlists),
+                        "playlists": [{"id": pl['id'], "name": pl['name']} for pl in playlists[offset:offset + limit]]
+                    }}
+                if method == 'delete':
+                    state.playlists.pop(params.get('id'), None)
+                    return {"success": True}
+        return {"success": False, "error": {"code": 103}}
+
+    @staticmethod
+    def netease_track(song_id, name, artists):
+        return {"id": song_id, "name": name, "ar": [{"name": artist} for artist in artists]}
+
+    def handle_netease_playlist(self, params):
+        playlist_id = params.get('id')
+        tracks = self.state.external_tracks('netease', playlist_id, self.state.config.netease_size)
+        limit = int(params.get('n', NETEASE_TRACK_LIMIT))
+        track_ids = [int(playlist_id) * 100000 + i for i in range(len(tracks))]
+        return {"code": 200, "playlist": {
+            "id": int(playlist_id),
+            "name": f"网易云歌单 {playlist_id}",
+            "updateTime": 1700000000000,
+            "trackUpdateTime": 1700000000000,
+            "trackCount": len(tracks),
+            "trackIds": [{"id": song_id} for song_id in track_ids],
+            "tracks": [self.netease_track(song_id, name, artists)
+                       for song_id, (name, artists) in list(zip(track_ids, tracks))[:min(limit, NETEASE_TRACK_LIMIT)]]
+        }}
+
+    def handle_netease_songs(self, params):
+        songs = []
+        cache = {}
+        for item in json.loads(params.get('c', '[]')):
+            song_id = int(item['id'])
+            playlist_id, index = divmod(song_id, 100000)
+            if playlist_id not in cache:
+                cache[playlist_id] = self.state.external_tracks('netease', str(playlist_id), self.state.config.netease_size)
+            tracks = cache[playlist_id]
+            if index < len(tracks):
+                songs.append(self.netease_track(song_id, *tracks[index]))
+        return {"code": 200, "songs": songs}
+
+    def handle_qqmusic(self, params):
+        playlist_id = params.get('disstid')
+        tracks = self.state.external_tracks('qqmusic', playlist_id, self.state.config.qqmusic_size)
+        begin = int(params.get('song_begin', 0))
+        num = min(int(params.get('song_num', 15)), self.state.config.qqmusic_page_limit)
+        return {"code": 0, "cdlist": [{
+            "disstid": playlist_id,
+            "dissname": f"QQ 歌单 {playlist_id}",
+            "total_song_num": len(tracks),
+            "songnum": len(tracks),
+            "songlist": [{"name": name, "singer": [{"name": artist} for artist in artists]}
+                         for name, artists in tracks[begin:begin + num]]
+        }]}
+
+def start_fake_server(config=None, host='127.0.0.1', port=0):
+    """
+    在后台线程中启动模拟服务器，返回 (server, base_url)，server.state 为服务器数据。
+    用 server.shutdown() 停止。
+    """
+    config = config or FakeServerConfig()
+    state = FakeState(config)
+    handler = type('BoundFakeHandler', (FakeHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+def add_config_arguments(parser):
+    parser.add_argument('--library-size', type=int, default=10000, help="AudioStation 曲库歌曲数")
+    parser.add_argument('--netease-size', type=int, default=1500, help="网易云音乐歌单歌曲数")
+    parser.add_argument('--qqmusic-size', type=int, default=1500, help="QQ 音乐歌单歌曲数")
+    parser.add_argument('--latency', type=float, default=0.0, help="每个请求的基础延迟（毫秒）")
+    parser.add_argument('--jitter', type=float, default=0.0, help="额外随机延迟的上限（毫秒）")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="读取请求返回 503 的概率")
+    parser.add_argument('--write-error-rate', type=float, default=0.0, help="写入请求返回 503 的概率")
+    parser.add_argument('--song-page-limit', type=int, default=5000, help="Song.list 单次最多返回的歌曲数")
+    parser.add_argument('--qqmusic-page-limit', type=int, default=1000, help="QQ 音乐歌单接口单次最多返回的歌曲数")
+    parser.add_argument('--missing-ratio', type=float, default=0.1, help="平台歌单中不在曲库里的歌曲比例")
+    parser.add_argument('--seed', type=int, default=1, help="合成数据的随机种子")
+
+def config_from_args(args):
+    return FakeServerConfig(
+        library_size=args.library_size,
+        netease_size=args.netease_size,
+        qqmusic_size=args.qqmusic_size,
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.error_rate,
+        write_error_rate=args.write_error_rate,
+        missing_ratio=args.missing_ratio,
+        song_page_limit=args.song_page_limit,
+        qqmusic_page_limit=args.qqmusic_page_limit,
+        seed=args.seed
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AudioStation / 网易云音乐 / QQ 音乐模拟服务器")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    add_config_arguments(parser)
+    args = parser.parse_args(argv)
+    server, base_url = start_fake_server(config_from_args(args), args.host, args.port)
+    print(f"AudioStation 主机地址: {base_url}（任意用户名和密码）")
+    print(f"export TNOS_NETEASE_API_BASE={base_url}")
+    print(f"export TNOS_QQMUSIC_API_BASE={base_url}")
+    print("歌单链接示例: https://music.163.com/playlist?id=1  https://y.qq.com/n/yqq/playlist/2.html")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
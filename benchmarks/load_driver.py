@@ -0,0 +1,186 @@
+"""
+端到端压力测试：启动本地模拟服务器（benchmarks/fake_servers.py），
+按真实流程导入网易云音乐和 QQ 音乐歌单，并统计各阶段的耗时：
+登录、获取歌曲库、获取平台歌单、匹配、创建歌单、添加歌曲。
+
+延迟、错误率和数据规模都可以配置，结果连同客户端记录的指标（metrics.py）写入 JSON 文件。
+
+用法:
+    python benchmarks/load_driver.py
+    python benchmarks/load_driver.py --library-size 50000 --netease-size 5000 --latency 30 --jitter 20 --error-rate 0.05
+    python benchmarks/load_driver.py --netease-playlists 4 --qqmusic-playlists 4 --batch
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 压力测试不读写用户的缓存目录
+os.environ.setdefault('TNOS_CACHE_DIR', tempfile.mkdtemp(prefix='tnos_load_'))
+
+from fake_servers import start_fake_server, add_config_arguments, config_from_args
+from bench_matching import git_revision, RESULTS_DIR
+from metrics import metrics
+
+class StageTimer:
+    """
+    累计各阶段的耗时和次数，可在多个线程中使用。
+    """
+    def __init__(self):
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def measure(self, stage, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                stat = self.stages.setdefault(stage, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+                stat['count'] += 1
+                stat['total_s'] += elapsed
+                stat['max_s'] = max(stat['max_s'], elapsed)
+
+    def report(self):
+        with self.lock:
+            return {stage: {"count": stat['count'], "total_s": round(stat['total_s'], 4),
+                            "max_s": round(stat['max_s'], 4)}
+                    for stage, stat in self.stages.items()}
+
+def playlist_links(args):
+    links = [f"https://music.163.com/playlist?id={n}" for n in range(1, args.netease_playlists + 1)]
+    links += [f"https://y.qq.com/n/ryqq/playlist/{n}" for n in range(1, args.qqmusic_playlists + 1)]
+    return links
+
+def run_sequential(client, links, args, timer, log_func):
+    """
+    逐个歌单按 GUI 的流程导入，分阶段计时。
+    """
+    from audiostation import parse_song_entry
+    from playlist_service import fetch_song_list_from_link
+
+    results = []
+    for link in links:
+        result = {"link": link, "ok": False}
+        results.append(result)
+        playlist_name, song_list = timer.measure('fetch_playlist', fetch_song_list_from_link, link, use_cache=False)
+        result['total'] = len(song_list)
+        if not song_list:
+            continue
+        song_entries = [entry for entry in map(parse_song_entry, song_list) if entry]
+        song_ids = timer.measure('match', client.match_song_entries, song_entries, args.threshold, log_func)
+        result['matched'] = len(song_ids)
+        if not song_ids:
+            continue
+        playlist_id = timer.measure('create_playlist', client.create_playlist, playlist_name, log_func)
+        if not playlist_id:
+            continue
+        result['ok'] = bool(timer.measure('add_songs', client.add_songs_to_playlist, playlist_id, song_ids, log_func))
+    return results
+
+def run_batch(client, links, args, timer, log_func):
+    """
+    通过 import_playlists_from_links 批量导入，只统计整体耗时。
+    """
+    from playlist_service import import_playlists_from_links
+
+    summaries = timer.measure('batch_import', import_playlists_from_links, client, [(link, '') for link in links],
+                              args.threshold, log_func, import_workers=args.import_workers)
+    return [{"link": summary['link'], "ok": summary['status'] == 'ok', "status": summary['status'],
+             "total": summary['total'], "matched": summary['matched']} for summary in summaries]
+
+def print_summary(report):
+    print(f"{'阶段':<16} {'次数':>6} {'总耗时(s)':>10} {'最长(s)':>9}")
+    for stage, stat in report['stages'].items():
+        print(f"{stage:<16} {stat['count']:>6} {stat['total_s']:>10} {stat['max_s']:>9}")
+    succeeded = sum(1 for result in report['playlists'] if result['ok'])
+    print(f"成功导入 {succeeded}/{len(report['playlists'])} 个歌单，总耗时 {report['wall_time_s']} 秒")
+    print(f"服务器请求数: {report['server_requests']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="端到端压力测试（本地模拟服务器）")
+    add_config_arguments(parser)
+    parser.add_argument('--netease-playlists', type=int, default=1, help="导入的网易云音乐歌单数")
+    parser.add_argument('--qqmusic-playlists', type=int, default=1, help="导入的 QQ 音乐歌单数")
+    parser.add_argument('--threshold', type=int, default=70, help="匹配阈值")
+    parser.add_argument('--batch', action='store_true', help="使用批量导入 (import_playlists_from_links)")
+    parser.add_argument('--import-workers', type=int, default=4, help="批量导入时同时创建和填充的歌单数")
+    parser.add_argument('--verbose', action='store_true', help="输出客户端日志")
+    parser.add_argument('--output', help="结果文件，默认写入 benchmarks/results/")
+    parser.add_argument('--prometheus', metavar='FILE', help="同时以 Prometheus 文本格式导出客户端指标")
+    args = parser.parse_args(argv)
+
+    server, base_url = start_fake_server(config_from_args(args))
+    # 平台模块在首次使用时才导入，在此之前设置接口地址即可指向模拟服务器
+    os.environ['TNOS_NETEASE_API_BASE'] = base_url
+    os.environ['TNOS_QQMUSIC_API_BASE'] = base_url
+
+    from audiostation import AudioStationClient
+
+    log_func = print if args.verbose else (lambda message: None)
+    timer = StageTimer()
+    metrics.reset()
+    wall_start = time.perf_counter()
+    client = AudioStationClient(base_url, 'load', 'load')
+    client.persist_cache = False
+    client.use_match_cache = False
+    client.log_each_match = args.verbose
+    try:
+        if not timer.measure('login', lambda: client.get_available_endpoints() and client.login()):
+            print("登录模拟服务器失败", file=sys.stderr)
+            return 1
+        if not timer.measure('fetch_library', client.fetch_all_songs, log_func):
+            print("获取歌曲库失败", file=sys.stderr)
+            return 1
+        links = playlist_links(args)
+        runner = run_batch if args.batch else run_sequential
+        if args.verbose:
+            playlists = runner(client, links, args, timer, log_func)
+        else:
+            # 客户端的 print 输出较多，压力测试时只保留结果
+            with open(os.devnull, 'w') as devnull:
+                stdout, sys.stdout = sys.stdout, devnull
+                try:
+                    playlists = runner(client, links, args, timer, log_func)
+                finally:
+                    sys.stdout = stdout
+    finally:
+        server.shutdown()
+
+    report = {
+        "benchmark": "load",
+        "created_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": vars(args),
+        "wall_time_s": round(time.perf_counter() - wall_start, 4),
+        "stages": timer.report(),
+        "playlists": playlists,
+        "transport": client.transport.get_stats(),
+        "server_requests": dict(server.state.requests),
+        "metrics": metrics.report()
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"load_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.prometheus:
+        metrics.save(args.prometheus, 'prometheus')
+    print_summary(report)
+    print(f"结果已保存到 {output}")
+    return 0 if all(result['ok'] for result in playlists) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+基准测试和压力测试共用的合成数据：歌曲库、带标准答案的待匹配歌曲行。
+同一个 seed 生成的数据完全相同，便于不同版本之间对比。
+"""
+import random
+
+LATIN_WORDS = [
+    'love', 'night', 'rain', 'sun', 'heart', 'dream', 'fire', 'moon', 'star', 'blue',
+    'summer', 'city', 'light', 'river', 'home', 'road', 'dance', 'forever', 'ocean', 'silver'
+]
+CJK_CHARS = '晴天花海夜曲风雨爱心梦光星月城河路舞远方时间故事青春回忆孤独温柔'
+LATIN_ARTISTS = [
+    'The Beatles', 'Adele', 'Taylor Swift', 'Queen', 'Coldplay', 'Ed Sheeran', 'Radiohead', 'Oasis',
+    'Daft Punk', 'Norah Jones'
+]
+CJK_ARTISTS = ['周杰伦', '毛不易', '林俊杰', '陈奕迅', '王菲', '邓紫棋', '李健', '朴树', '孙燕姿', '五月天']
+ARTIST_SEPARATORS = [' / ', '/', '、', ', ']
+TITLE_SUFFIXES = [' (Live)', ' (Remastered)', ' - 伴奏', ' (Demo)']
+
+def _title(rng):
+    if rng.random() < 0.5:
+        return ''.join(rng.choice(CJK_CHARS) for _ in range(rng.randint(2, 6)))
+    return ' '.join(rng.choice(LATIN_WORDS) for _ in range(rng.randint(1, 4))).title()
+
+def _artists(rng, count):
+    pool = CJK_ARTISTS + LATIN_ARTISTS
+    # 额外生成带编号的歌手，使大曲库中的歌手数量随规模增长
+    return [rng.choice(pool) + (f" {rng.randint(1, 500)}" if rng.random() < 0.5 else '') for _ in range(count)]
+
+def make_library(size, seed=1):
+    """
+    生成 size 首歌曲，结构与 AudioStation Song.list 返回的一致：
+    中文和拉丁文标题各半，约 20% 的歌曲有多个歌手，部分标题带版本后缀。
+    """
+    rng = random.Random(seed)
+    songs = []
+    for i in range(size):
+        title = _title(rng)
+        if rng.random() < 0.1:
+            title += rng.choice(TITLE_SUFFIXES)
+        artist_count = 1 if rng.random() < 0.8 else rng.randint(2, 3)
+        artist = rng.choice(ARTIST_SEPARATORS).join(_artists(rng, artist_count))
+        songs.append({
+            "id": f"music_{i}",
+            "title": title,
+            "additional": {"song_tag": {"artist": artist, "album": f"Album {i // 12}"}}
+        })
+    return songs
+
+def _typo(rng, text):
+    if len(text) < 4:
+        return text
+    pos = rng.randrange(len(text))
+    return text[:pos] + text[pos + 1:]
+
+def make_queries(library, count, seed=2, missing_ratio=0.1):
+    """
+    从歌曲库中抽取 count 行 "歌曲名 - 歌手"，返回 [(行, 期望的歌曲 ID 或 None), ...]。
+    变体包括：原样、大小写和空白变化、单字错漏、只保留第一个歌手、
+    去掉版本后缀、"歌手 - 歌曲名" 的倒置写法，以及曲库中不存在的歌曲（期望为 None）。
+    """
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        if rng.random() < missing_ratio:
+            title = ' '.join(rng.choice(LATIN_WORDS) for _ in range(3)) + ' zq'
+            queries.append((f"{title} - Unknown Artist {rng.randint(1, 10 ** 6)}", None))
+            continue
+        song = rng.choice(library)
+        title = song['title']
+        artist = song['additional']['song_tag']['artist']
+        variant = rng.random()
+        if variant < 0.35:
+            line = f"{title} - {artist}"
+        elif variant < 0.5:
+            line = f"{title.upper()}  -  {artist.lower()}"
+        elif variant < 0.65:
+            line = f"{_typo(rng, title)} - {artist}"
+        elif variant < 0.75:
+            first_artist = artist.replace('、', '/').replace(',', '/').split('/')[0].strip()
+            line = f"{title} - {first_artist}"
+        elif variant < 0.85:
+            base = title
+            for suffix in TITLE_SUFFIXES:
+                base = base.replace(suffix, '')
+            line = f"{base} - {artist}"
+        else:
+            line = f"{artist} - {title}"
+        queries.append((line, song['id']))
+    return queries
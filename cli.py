@@ -0,0 +1,193 @@
+import os
+import sys
+import json
+import argparse
+import threading
+import contextlib
+
+from audiostation import AudioStationClient
+from metrics import metrics
+from playlist_service import fetch_song_list_from_link, import_playlists_from_links
+
+# 退出码：0 成功，1 操作失败，2 参数错误或无法登录
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+# 标准输出只写 JSON 行，客户端的 print 输出重定向到标准错误
+_stdout = sys.stdout
+# 批量导入时多个线程同时输出事件，每行整行写入
+_emit_lock = threading.Lock()
+
+def emit(event, **fields):
+    """
+    向标准输出写一行 JSON 事件，可在多个线程中调用。
+    """
+    line = json.dumps({"event": event, **fields}, ensure_ascii=False) + "\n"
+    with _emit_lock:
+        _stdout.write(line)
+        _stdout.flush()
+
+def log_event(message):
+    emit("log", message=message)
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="TNOSaudiostation",
+        description="无界面模式：登录 AudioStation 并导入、查看或删除歌单。进度以 JSON 行输出到标准输出。"
+    )
+    parser.add_argument("--host", default=os.environ.get("TNOS_HOST"),
+                        help="群晖主机地址，默认读取环境变量 TNOS_HOST")
+    parser.add_argument("--username", default=os.environ.get("TNOS_USERNAME"),
+                        help="用户名，默认读取环境变量 TNOS_USERNAME")
+    parser.add_argument("--password", default=os.environ.get("TNOS_PASSWORD"),
+                        help="密码，默认读取环境变量 TNOS_PASSWORD")
+    parser.add_argument("--threshold", type=int, default=70, help="匹配阈值 (0-100)，默认 70")
+    parser.add_argument("--cached-library", action="store_true",
+                        help="优先使用本地缓存的歌曲库，不存在时再从服务器获取")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="结束时导出各阶段耗时、请求统计和匹配耗时直方图，- 表示作为 metrics 事件输出")
+    parser.add_argument("--metrics-format", choices=["json", "prometheus"], default="json",
+                        help="指标导出格式，默认 json")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_link = subparsers.add_parser("import-link", help="从网易云音乐或 QQ 音乐链接导入歌单")
+    import_link.add_argument("link", help="歌单链接")
+    import_link.add_argument("--name", help="新歌单名称，默认使用平台歌单名")
+
+    import_file = subparsers.add_parser("import-file", help="从 txt 文件导入歌单")
+    import_file.add_argument("file", help="每行为 \"歌曲名 - 歌手\" 的文本文件")
+    import_file.add_argument("--name", required=True, help="新歌单名称")
+
+    import_batch = subparsers.add_parser("import-batch", help="批量导入多个歌单链接")
+    import_batch.add_argument("file", help="每行一个歌单，格式为 \"链接\" 或 \"链接<Tab>歌单名称\"")
+    import_batch.add_argument("--workers", type=int, default=4, help="同时创建和填充的歌单数，默认 4")
+
+    subparsers.add_parser("list", help="列出 AudioStation 中的歌单")
+
+    delete = subparsers.add_parser("delete", help="删除歌单")
+    delete.add_argument("playlist_ids", nargs="+", help="要删除的歌单 ID")
+
+    return parser
+
+def read_batch_file(file_path):
+    """
+    读取批量导入文件，返回 [(链接, 歌单名称), ...]，空行和 # 开头的行会被忽略。
+    """
+    items = []
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            link, _, name = line.partition('\t')
+            items.append((link.strip(), name.strip()))
+    return items
+
+def connect(args):
+    """
+    登录，指定 --cached-library 时加载本地缓存的歌曲库，登录失败时返回 None。
+    """
+    client = AudioStationClient(args.host, args.username, args.password)
+    if not client.get_available_endpoints() or not client.login():
+        emit("error", message="登录失败")
+        return None
+    emit("login", host=client.host)
+    # 没有加载缓存时不预先获取歌曲库：单个歌单边获取边匹配，批量导入在获取平台歌单的同时获取
+    if args.command.startswith("import") and args.cached_library and client.load_cached_songs(log_event):
+        emit("library", songs=len(client.all_songs_cache))
+    return client
+
+def run_import_link(client, args):
+    playlist_name, songs = fetch_song_list_from_link(args.link)
+    if not songs:
+        emit("result", ok=False, message="无法获取歌单")
+        return EXIT_FAILED
+    playlist_name = args.name or playlist_name
+    ok = client.import_playlist_from_song_list(songs, playlist_name, args.threshold, log_func=log_event)
+    emit("result", ok=bool(ok), name=playlist_name, total=len(songs), stats=dict(client.match_stats))
+    return EXIT_OK if ok else EXIT_FAILED
+
+def run_import_file(client, args):
+    ok = client.import_playlist_from_file(args.file, args.name, args.threshold, log_func=log_event)
+    emit("result", ok=bool(ok), name=args.name, stats=dict(client.match_stats))
+    return EXIT_OK if ok else EXIT_FAILED
+
+def run_import_batch(client, args):
+    items = read_batch_file(args.file)
+    summaries = import_playlists_from_links(client, items, args.threshold, log_func=log_event,
+                                            import_workers=args.workers)
+    for summary in summaries:
+        emit("playlist_result", **summary)
+    succeeded = sum(1 for summary in summaries if summary['status'] == 'ok')
+    ok = succeeded == len(summaries)
+    emit("result", ok=ok, succeeded=succeeded, total=len(summaries))
+    return EXIT_OK if ok else EXIT_FAILED
+
+def run_list(client, args):
+    count = 0
+    for page in client.iter_playlist_pages(log_func=log_event):
+        if page is None:
+            emit("result", ok=False, count=count, message="获取播放列表失败")
+            return EXIT_FAILED
+        for playlist in page:
+            emit("playlist", id=playlist.get('id'), name=playlist.get('name'))
+        count += len(page)
+    emit("result", ok=True, count=count)
+    return EXIT_OK
+
+def run_delete(client, args):
+    failed = [playlist_id for playlist_id in args.playlist_ids
+              if not client.delete_playlist(playlist_id, log_func=log_event)]
+    emit("result", ok=not failed, deleted=len(args.playlist_ids) - len(failed), failed=failed)
+    return EXIT_FAILED if failed else EXIT_OK
+
+def export_metrics(args):
+    """
+    按 --metrics 和 --metrics-format 导出本次运行的指标。
+    """
+    if args.metrics == "-":
+        if args.metrics_format == "prometheus":
+            emit("metrics", text=metrics.to_prometheus())
+        else:
+            emit("metrics", **metrics.report())
+        return
+    try:
+        metrics.save(args.metrics, args.metrics_format)
+    except OSError as e:
+        emit("error", message=f"无法写入指标文件: {e}")
+
+COMMANDS = {
+    "import-link": run_import_link,
+    "import-file": run_import_file,
+    "import-batch": run_import_batch,
+    "list": run_list,
+    "delete": run_delete,
+}
+
+def main(argv=None):
+    """
+    命令行入口，返回退出码。
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.host or not args.username or not args.password:
+        parser.print_usage(sys.stderr)
+        emit("error", message="缺少主机地址、用户名或密码")
+        return EXIT_USAGE
+    if not 0 <= args.threshold <= 100:
+        emit("error", message="匹配阈值应在 0 到 100 之间")
+        return EXIT_USAGE
+
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            client = connect(args)
+            if client is None:
+                return EXIT_USAGE
+            return COMMANDS[args.command](client, args)
+        except OSError as e:
+            emit("error", message=str(e))
+            return EXIT_FAILED
+        finally:
+            if args.metrics:
+                export_metrics(args)
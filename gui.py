@@ -1,11 +1,58 @@
+import time
+import queue
 import threading
+import tkinter
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 from tkinter import messagebox, filedialog
 from tkinter.scrolledtext import ScrolledText
 
-from audiostation import AudioStationClient
-from playlist_service import fetch_song_list_from_link
+# 进度条上显示的阶段名称
+PROGRESS_STAGE_NAMES = {
+    'match': "匹配歌曲",
+    'add': "添加到歌单",
+}
+
+class LogBuffer:
+    """
+    线程安全的日志缓冲。各线程把消息放入队列，Tk 主线程每隔 interval 毫秒批量写入文本框，
+    文本框只保留最近 max_lines 行，避免大批量导入时日志回调挤满事件队列。
+    """
+    def __init__(self, widget, interval=100, max_lines=2000):
+        self.widget = widget
+        self.interval = interval
+        self.max_lines = max_lines
+        self.queue = queue.SimpleQueue()
+        self.widget.after(self.interval, self.flush)
+
+    def put(self, message):
+        self.queue.put(message)
+
+    def flush(self):
+        lines = []
+        while True:
+            try:
+                lines.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            # 窗口已关闭时 after 仍会继续调度，队列为空时不会触发 TclError，需主动停止
+            if not self.widget.winfo_exists():
+                return
+            if lines:
+                # 一次写入的行数超过上限时只写最后的部分
+                text = "\n".join(lines[-self.max_lines:]) + "\n"
+                self.widget.configure(state='normal')
+                self.widget.insert('end', text)
+                line_count = int(self.widget.index('end-1c').split('.')[0]) - 1
+                if line_count > self.max_lines:
+                    self.widget.delete('1.0', f"{line_count - self.max_lines + 1}.0")
+                self.widget.see('end')
+                self.widget.configure(state='disabled')
+            self.widget.after(self.interval, self.flush)
+        except tkinter.TclError:
+            # 窗口已关闭，停止刷新
+            pass
 
 class LoginWindow(ttk.Toplevel):
     def __init__(self, app, parent):
@@ -59,6 +106,7 @@ class LoginWindow(ttk.Toplevel):
         ttk.Label(self, text="状态:").grid(column=0, row=4, sticky='NW', **padding)
         self.status_text = ScrolledText(self, height=5, width=35, state='disabled')
         self.status_text.grid(column=0, row=5, columnspan=2, sticky='EW', **padding)
+        self.log_buffer = LogBuffer(self.status_text)
 
     def login(self):
         host = self.host_var.get().strip()
@@ -73,6 +121,8 @@ class LoginWindow(ttk.Toplevel):
         self.log_status("开始登录群晖AudioStation...")
 
         def perform_login():
+            # 客户端依赖的 requests 等模块在登录时才加载，缩短窗口出现前的启动时间
+            from audiostation import AudioStationClient
             self.app.audio_client = AudioStationClient(host, username, password)
             if not self.app.audio_client.get_available_endpoints():
                 self.show_login_failure("乐，链接失败检查主机地址！\n要不就是你群晖有点毛病！")
@@ -80,10 +130,14 @@ class LoginWindow(ttk.Toplevel):
             if not self.app.audio_client.login():
                 self.show_login_failure("乐，登录失败。")
                 return
-            if not self.app.audio_client.fetch_all_songs(log_func=self.log_status):
-                self.show_login_failure("乐，获取歌曲缓存失败。")
+            if self.app.audio_client.load_cached_songs(log_func=self.log_status):
+                # 先用本地缓存进入主界面，再在后台刷新歌曲库
+                self.log_status("登录成功，正在后台刷新歌曲缓存。")
+                self.show_login_success()
+                self.app.refresh_library()
                 return
-            self.log_status("登录并缓存歌曲成功。")
+            # 没有本地缓存时直接进入主界面，第一次导入时边获取歌曲库边匹配
+            self.log_status("登录成功，歌曲库将在第一次导入时获取。")
             self.show_login_success()
 
         threading.Thread(target=perform_login, daemon=True).start()
@@ -100,12 +154,7 @@ class LoginWindow(ttk.Toplevel):
         self.app.create_main_window()
 
     def log_status(self, message):
-        def append_message():
-            self.status_text.configure(state='normal')
-            self.status_text.insert('end', f"{message}\n")
-            self.status_text.see('end')
-            self.status_text.configure(state='disabled')
-        self.after(0, append_message)
+        self.log_buffer.put(message)
 
     def on_close(self):
         if messagebox.askokcancel("离开", "真的要退出程序吗？QWQ"):
@@ -131,9 +180,20 @@ class Application:
         self.new_playlist_name_var = ttk.StringVar()
         self.threshold_var = ttk.StringVar(value="70")
         self.import_mode = ttk.StringVar(value='link')
+        self.verbose_log_var = ttk.BooleanVar(value=False)
         self.selected_file_path = ''
 
+        # 导入任务依次在后台线程中执行，current_cancel 为当前任务的取消标志
+        self.import_jobs = queue.Queue()
+        # 每次加载歌单列表递增，丢弃过期加载线程的结果
+        self.playlist_generation = 0
+        self.current_cancel = None
+        self.progress_state = None
+        self.progress_started = {}
+
         self.create_main_widgets()
+        threading.Thread(target=self.run_import_jobs, daemon=True).start()
+        self.poll_progress()
 
         self.root.mainloop()
 
@@ -148,6 +208,10 @@ class Application:
         self.root.deiconify()  # 显示主窗口
         # 更新主窗口的内容
         self.notebook.pack(expand=True, fill='both')
+        # 先显示本地缓存的歌单列表，再在后台从服务器刷新
+        cached = self.audio_client.load_cached_playlists()
+        if cached:
+            self.fill_playlist_page(self.playlist_generation, cached, 0, set())
         self.load_playlists()
 
     def create_main_widgets(self):
@@ -166,8 +230,15 @@ class Application:
     def create_manage_tab(self):
         padding = {'padx': 10, 'pady': 10}
 
-        # 仅显示"名称"列，去掉"ID"列
-        ttk.Label(self.manage_frame, text="现有歌单:").pack(anchor='w', **padding)
+        # 仅显示"名称"列，歌单 ID 作为每行的 iid
+        header = ttk.Frame(self.manage_frame)
+        header.pack(fill='x', **padding)
+        ttk.Label(header, text="现有歌单:").pack(side='left')
+        self.playlist_status_label = ttk.Label(header, text="")
+        self.playlist_status_label.pack(side='left', padx=10)
+        self.refresh_playlists_button = ttk.Button(header, text="刷新", bootstyle=(INFO, OUTLINE),
+                                                   command=self.load_playlists)
+        self.refresh_playlists_button.pack(side='right')
 
         # 修改Treeview，移除ID列
         self.playlist_tree = ttk.Treeview(self.manage_frame, columns=("Name",), show='headings', selectmode='browse')
@@ -214,14 +285,28 @@ class Application:
         ttk.Label(self.import_frame, text="匹配阈值 (默认70，范围0-100)\n匹配不好就低一点:").grid(column=0, row=4, sticky='W', **padding)
         ttk.Entry(self.import_frame, textvariable=self.threshold_var, width=10).grid(column=1, row=4, sticky='W', **padding)
 
-        # Import Button
+        # Verbose Log
+        ttk.Checkbutton(self.import_frame, text="显示每首歌曲的匹配日志", variable=self.verbose_log_var,
+                        bootstyle="round-toggle").grid(column=0, row=5, sticky='W', **padding)
+
+        # Import / Cancel Buttons
         self.import_button = ttk.Button(self.import_frame, text="导入歌单", bootstyle=SUCCESS, command=self.import_playlist)
         self.import_button.grid(column=1, row=5, sticky='E', **padding)
+        self.cancel_button = ttk.Button(self.import_frame, text="取消当前导入", bootstyle=DANGER,
+                                        command=self.cancel_import, state='disabled')
+        self.cancel_button.grid(column=2, row=5, sticky='W', **padding)
+
+        # Progress
+        self.progress_bar = ttk.Progressbar(self.import_frame, mode='determinate', bootstyle=SUCCESS)
+        self.progress_bar.grid(column=0, row=6, columnspan=3, sticky='EW', **padding)
+        self.progress_label = ttk.Label(self.import_frame, text="空闲")
+        self.progress_label.grid(column=0, row=7, columnspan=3, sticky='W', padx=10)
 
         # Status Text
-        ttk.Label(self.import_frame, text="导入状态:").grid(column=0, row=6, sticky='NW', **padding)
-        self.status_text = ScrolledText(self.import_frame, height=20, width=100, state='disabled')
-        self.status_text.grid(column=0, row=7, columnspan=3, sticky='EW', **padding)
+        ttk.Label(self.import_frame, text="导入状态:").grid(column=0, row=8, sticky='NW', **padding)
+        self.status_text = ScrolledText(self.import_frame, height=16, width=100, state='disabled')
+        self.status_text.grid(column=0, row=9, columnspan=3, sticky='EW', **padding)
+        self.log_buffer = LogBuffer(self.status_text)
 
     def update_import_mode(self):
         mode = self.import_mode.get()
@@ -251,18 +336,80 @@ class Application:
             self.selected_file_label.config(text="未选择文件")
 
     def load_playlists(self):
-        playlists = self.audio_client.get_playlist_list()
+        """
+        在后台线程中分页获取歌单列表，每收到一页就更新到表格中，不阻塞界面
+        """
+        self.playlist_generation += 1
+        generation = self.playlist_generation
+        self.playlist_status_label.configure(text="正在加载歌单...")
+        self.refresh_playlists_button.configure(state='disabled')
+
+        def perform_load():
+            playlists = []
+            seen = set()
+            for page in self.audio_client.iter_playlist_pages(log_func=self.log_status):
+                if page is None:
+                    self.root.after(0, self.finish_playlist_load, generation, None, seen)
+                    return
+                self.root.after(0, self.fill_playlist_page, generation, page, len(playlists), seen)
+                playlists.extend(page)
+            self.audio_client.save_playlists_cache(playlists)
+            self.root.after(0, self.finish_playlist_load, generation, playlists, seen)
+
+        threading.Thread(target=perform_load, daemon=True).start()
+
+    def fill_playlist_page(self, generation, page, start, seen):
+        """
+        将一页歌单写入表格：已存在的行更新名称并移动到对应位置，不存在的行插入
+        """
+        if generation != self.playlist_generation:
+            return
+        for index, pl in enumerate(page, start):
+            playlist_id = pl['id']
+            if playlist_id in seen:
+                continue
+            seen.add(playlist_id)
+            if self.playlist_tree.exists(playlist_id):
+                self.playlist_tree.item(playlist_id, values=(pl.get('name', ''),))
+                self.playlist_tree.move(playlist_id, '', index)
+            else:
+                self.playlist_tree.insert('', index, iid=playlist_id, values=(pl.get('name', ''),))
+
+    def finish_playlist_load(self, generation, playlists, seen):
+        if generation != self.playlist_generation:
+            return
+        self.refresh_playlists_button.configure(state='normal')
+        if playlists is None:
+            self.playlist_status_label.configure(text="加载失败，当前显示的可能不是最新列表")
+            return
+        # 移除服务器上已不存在的歌单
         for item in self.playlist_tree.get_children():
-            self.playlist_tree.delete(item)
-        for pl in playlists:
-            self.playlist_tree.insert('', 'end', values=(pl['id'], pl['name']))
+            if item not in seen:
+                self.playlist_tree.delete(item)
+        self.playlist_status_label.configure(text=f"共 {len(playlists)} 个歌单")
+
+    def playlist_name(self, playlist_id):
+        # Treeview 会把纯数字的值转换为整数，空值返回空字符串
+        values = self.playlist_tree.item(playlist_id, 'values')
+        return str(values[0]) if values else ''
+
+    def save_visible_playlists(self):
+        """
+        将表格中当前的歌单写回本地缓存
+        """
+        playlists = [
+            {"id": item, "name": self.playlist_name(item)}
+            for item in self.playlist_tree.get_children()
+        ]
+        self.audio_client.save_playlists_cache(playlists)
 
     def delete_selected_playlist(self):
         selected = self.playlist_tree.selection()
         if not selected:
             messagebox.showwarning("选择错误", "请先选择一个歌单。")
             return
-        playlist_id, playlist_name = self.playlist_tree.item(selected[0], 'values')
+        playlist_id = selected[0]
+        playlist_name = self.playlist_name(playlist_id)
         confirm = messagebox.askyesno("确认删除", f"确定要删除歌单 '{playlist_name}' 吗？")
         if not confirm:
             return
@@ -272,9 +419,14 @@ class Application:
         def perform_delete():
             self.log_status(f"正在删除歌单: {playlist_name} (ID: {playlist_id})...")
             success = self.audio_client.delete_playlist(playlist_id, log_func=self.log_status)
+            self.root.after(0, finish_delete, success)
+
+        def finish_delete(success):
             if success:
                 self.log_status(f"成功删除歌单: {playlist_name} (ID: {playlist_id})")
-                self.playlist_tree.delete(selected[0])
+                if self.playlist_tree.exists(playlist_id):
+                    self.playlist_tree.delete(playlist_id)
+                self.save_visible_playlists()
                 messagebox.showinfo("删除成功", f"成功删除歌单 '{playlist_name}'。")
             else:
                 self.log_status(f"删除歌单失败: {playlist_name} (ID: {playlist_id})")
@@ -315,48 +467,128 @@ class Application:
             messagebox.showwarning("输入错误", "请选择导入方式。")
             return
 
-        self.import_button.configure(state='disabled')
-
-        def perform_import():
-            if import_mode == 'link':
-                self.log_status(f"开始从链接导入歌单: {new_playlist_name}")
-                playlist_name, songs = fetch_song_list_from_link(link)
-                if not songs:
-                    self.log_status("未能获取到有效的歌曲列表，导入终止。")
-                    messagebox.showerror("导入失败", "未能获取到有效的歌曲列表。")
-                    self.enable_import_widgets()
-                    return
-                self.log_status(f"歌单名称: {playlist_name}")
-                self.log_status(f"歌曲总数: {len(songs)}")
-                if new_playlist_name != playlist_name:
-                    self.log_status(f"自定义歌单名称: {new_playlist_name}")
-                success = self.audio_client.import_playlist_from_song_list(songs, new_playlist_name, threshold, log_func=self.log_status)
-            elif import_mode == 'file':
-                self.log_status(f"开始从文件导入歌单: {new_playlist_name}")
-                file_path = self.selected_file_path
-                success = self.audio_client.import_playlist_from_file(file_path, new_playlist_name, threshold, log_func=self.log_status)
-            else:
-                self.log_status("未知的导入方式，导入终止。")
-                success = False
-
-            if success:
-                self.log_status("歌单导入成功！")
-                messagebox.showinfo("导入成功", f"歌单 '{new_playlist_name}' 导入成功。")
-                self.load_playlists()
+        job = {
+            "mode": import_mode,
+            "link": self.playlist_link_var.get().strip(),
+            "file_path": self.selected_file_path,
+            "name": new_playlist_name,
+            "threshold": threshold,
+            "verbose": self.verbose_log_var.get()
+        }
+        waiting = self.import_jobs.qsize() + (1 if self.current_cancel else 0)
+        self.import_jobs.put(job)
+        if waiting:
+            self.log_status(f"已加入导入队列: {new_playlist_name}（前面还有 {waiting} 个任务）")
+
+    def run_import_jobs(self):
+        """
+        后台工作线程，按提交顺序依次执行导入任务
+        """
+        while True:
+            job = self.import_jobs.get()
+            cancel_event = threading.Event()
+            self.current_cancel = cancel_event
+            self.progress_started = {}
+            self.progress_state = None
+            try:
+                self.perform_import(job, cancel_event)
+            except Exception as e:
+                self.log_status(f"导入时发生错误: {e}")
+            finally:
+                self.current_cancel = None
+                self.progress_state = None
+
+    def perform_import(self, job, cancel_event):
+        new_playlist_name = job['name']
+        # 不显示逐首日志时，匹配结果只输出汇总
+        self.audio_client.log_each_match = job['verbose']
+        if job['mode'] == 'link':
+            self.log_status(f"开始从链接导入歌单: {new_playlist_name}")
+            from playlist_service import fetch_song_list_from_link
+            playlist_name, songs = fetch_song_list_from_link(job['link'])
+            if not songs:
+                self.log_status("未能获取到有效的歌曲列表，导入终止。")
+                self.root.after(0, lambda: messagebox.showerror("导入失败", "未能获取到有效的歌曲列表。"))
+                return
+            self.log_status(f"歌单名称: {playlist_name}")
+            self.log_status(f"歌曲总数: {len(songs)}")
+            if new_playlist_name != playlist_name:
+                self.log_status(f"自定义歌单名称: {new_playlist_name}")
+            success = self.audio_client.import_playlist_from_song_list(
+                songs, new_playlist_name, job['threshold'], log_func=self.log_status,
+                progress_func=self.report_progress, cancel_event=cancel_event)
+        elif job['mode'] == 'file':
+            self.log_status(f"开始从文件导入歌单: {new_playlist_name}")
+            success = self.audio_client.import_playlist_from_file(
+                job['file_path'], new_playlist_name, job['threshold'], log_func=self.log_status,
+                progress_func=self.report_progress, cancel_event=cancel_event)
+        else:
+            self.log_status("未知的导入方式，导入终止。")
+            success = False
+
+        if cancel_event.is_set():
+            self.log_status(f"歌单 '{new_playlist_name}' 的导入已取消。")
+        elif success:
+            self.log_status("歌单导入成功！")
+            self.root.after(0, lambda: messagebox.showinfo("导入成功", f"歌单 '{new_playlist_name}' 导入成功。"))
+            self.root.after(0, self.load_playlists)
+        else:
+            self.log_status("歌单导入失败。")
+            self.root.after(0, lambda: messagebox.showerror("导入失败", f"歌单 '{new_playlist_name}' 导入失败。"))
+
+    def cancel_import(self):
+        cancel_event = self.current_cancel
+        if cancel_event and not cancel_event.is_set():
+            cancel_event.set()
+            self.log_status("正在取消当前导入，将在当前批次完成后停止...")
+
+    def report_progress(self, stage, done, total):
+        """
+        由导入线程调用，记录进度和速度，界面由 poll_progress 定时刷新
+        """
+        now = time.monotonic()
+        started_at, started_done = self.progress_started.setdefault(stage, (now, done))
+        elapsed = now - started_at
+        rate = (done - started_done) / elapsed if elapsed > 0 else 0
+        eta = (total - done) / rate if rate > 0 else None
+        self.progress_state = (stage, done, total, rate, eta)
+
+    def poll_progress(self):
+        state = self.progress_state
+        running = self.current_cancel is not None
+        queued = self.import_jobs.qsize()
+        if state:
+            stage, done, total, rate, eta = state
+            self.progress_bar.configure(maximum=max(total, 1), value=done)
+            text = f"{PROGRESS_STAGE_NAMES.get(stage, stage)} {done}/{total}"
+            if rate > 0:
+                text += f"，{rate:.1f} 首/秒"
+            if eta is not None:
+                text += f"，预计剩余 {eta:.0f} 秒"
+        elif running:
+            self.progress_bar.configure(value=0)
+            text = "正在准备..."
+        else:
+            self.progress_bar.configure(value=0)
+            text = "空闲"
+        if queued:
+            text += f"（队列中还有 {queued} 个导入）"
+        self.progress_label.configure(text=text)
+        self.cancel_button.configure(state='normal' if running else 'disabled')
+        self.root.after(200, self.poll_progress)
+
+    def refresh_library(self):
+        """
+        在后台重新获取歌曲库，完成后替换匹配用的缓存并保存到本地
+        """
+        def perform_refresh():
+            self.log_status("正在后台刷新歌曲缓存...")
+            if self.audio_client.fetch_all_songs(log_func=self.log_status):
+                self.log_status("歌曲缓存刷新完成。")
             else:
-                self.log_status("歌单导入失败。")
-                messagebox.showerror("导入失败", "歌单导入失败。")
-            self.enable_import_widgets()
-
-        threading.Thread(target=perform_import, daemon=True).start()
+                self.log_status("歌曲缓存刷新失败，继续使用本地缓存。")
 
-    def enable_import_widgets(self):
-        self.import_button.configure(state='normal')
+        threading.Thread(target=perform_refresh, daemon=True).start()
 
     def log_status(self, message):
-        def append_message():
-            self.status_text.configure(state='normal')
-            self.status_text.insert('end', f"{message}\n")
-            self.status_text.see('end')
-            self.status_text.configure(state='disabled')
-        self.root.after(0, append_message)
\ No newline at end of file
+        self.log_buffer.put(message)
\ No newline at end of file
@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import hashlib
+
+from utils import get_cache_dir, cache_key
+
+def library_cache_path(host, username):
+    """
+    返回指定主机和用户的歌曲库缓存文件路径。
+    """
+    return os.path.join(get_cache_dir(), f"library_{cache_key(host, username)}.json")
+
+def compact_song(song):
+    """
+    只保留匹配需要的字段，减小缓存文件体积，加快启动时的加载速度。
+    """
+    return {
+        "id": song['id'],
+        "title": song.get('title', ''),
+        "additional": {"song_tag": song.get('additional', {}).get('song_tag', {})}
+    }
+
+def library_fingerprint(songs):
+    """
+    根据歌曲 ID 和总数生成歌曲库指纹，歌曲增删后指纹随之变化。
+    """
+    digest = hashlib.sha1(str(len(songs)).encode('utf-8'))
+    for song_id in sorted(song['id'] for song in songs):
+        digest.update(b'\0')
+        digest.update(str(song_id).encode('utf-8'))
+    return digest.hexdigest()
+
+def load_library_cache(host, username):
+    """
+    读取本地歌曲库缓存，返回 (歌曲列表, 保存时间)，不存在或损坏时返回 (None, None)。
+    """
+    path = library_cache_path(host, username)
+    if not os.path.exists(path):
+        return None, None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"读取歌曲缓存失败: {e}")
+        return None, None
+    if data.get('host') != host or data.get('username') != username:
+        return None, None
+    return data.get('songs', []), data.get('saved_at')
+
+def save_library_cache(host, username, songs):
+    """
+    将歌曲库保存到本地缓存，先写临时文件再替换，避免写入中断导致缓存损坏。
+    """
+    path = library_cache_path(host, username)
+    data = {
+        "host": host,
+        "username": username,
+        "saved_at": time.time(),
+        "songs": [compact_song(song) for song in songs]
+    }
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"保存歌曲缓存失败: {e}")
+        return False
+    return True
+
+def playlist_list_cache_path(host, username):
+    """
+    返回指定主机和用户的 AudioStation 歌单列表缓存文件路径。
+    """
+    return os.path.join(get_cache_dir(), f"playlists_{cache_key(host, username)}.json")
+
+def load_playlist_list_cache(host, username):
+    """
+    读取本地缓存的歌单列表 [{"id", "name"}, ...]，不存在或损坏时返回 None。
+    """
+    path = playlist_list_cache_path(host, username)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"读取歌单列表缓存失败: {e}")
+        return None
+    if data.get('host') != host or data.get('username') != username:
+        return None
+    return data.get('playlists', [])
+
+def save_playlist_list_cache(host, username, playlists):
+    """
+    保存歌单列表，只保留 ID 和名称。
+    """
+    path = playlist_list_cache_path(host, username)
+    data = {
+        "host": host,
+        "username": username,
+        "saved_at": time.time(),
+        "playlists": [{"id": pl['id'], "name": pl.get('name', '')} for pl in playlists]
+    }
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"保存歌单列表缓存失败: {e}")
+        return False
+    return True
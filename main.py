@@ -1,12 +1,15 @@
-import requests
 import sys
-from gui import Application
+import multiprocessing
 
 def main():
+    # 带参数运行时进入无界面的命令行模式，不加载 Tk
+    if len(sys.argv) > 1:
+        from cli import main as cli_main
+        sys.exit(cli_main(sys.argv[1:]))
+    from gui import Application
     app = Application()
 
 if __name__ == "__main__":
-    # 禁用SSL警告
-    from requests.packages.urllib3.exceptions import InsecureRequestWarning
-    requests.packages.urllib3.disable_warnings(category=InsecureRequestWarning)
+    # 打包为可执行文件时并行匹配的子进程需要
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
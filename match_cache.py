@@ -0,0 +1,105 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+
+from utils import get_cache_dir, cache_key
+from song_index import normalize_text
+
+def normalize_key(title, artist, bidirectional=False):
+    """
+    将 (title, artist) 归一化为缓存键：转小写并合并空白。
+    双向匹配的结果与单向不同，使用单独的键。
+    """
+    prefix = "\t" if bidirectional else ""
+    return f"{prefix}{normalize_text(title)}\t{normalize_text(artist)}"
+
+def match_cache_path(host, username):
+    """
+    返回指定主机和用户的匹配结果缓存文件路径。
+    """
+    return os.path.join(get_cache_dir(), f"matches_{cache_key(host, username)}.json")
+
+class MatchCache:
+    """
+    匹配结果缓存，将归一化的 (title, artist) 映射到 (歌曲 ID, 得分)。
+    按最近使用顺序淘汰，超过 max_size 时丢弃最久未使用的条目。
+    fingerprint 标识生成这些结果的歌曲库和匹配设置，不一致时整个缓存作废。
+    """
+    def __init__(self, path=None, max_size=20000):
+        self.path = path
+        self.max_size = max_size
+        self.fingerprint = None
+        self.entries = OrderedDict()
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load(self):
+        """
+        从文件读取缓存，文件不存在或损坏时保持为空。
+        """
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取匹配缓存失败: {e}")
+            return
+        with self.lock:
+            self.fingerprint = data.get('fingerprint')
+            self.entries = OrderedDict((key, tuple(value)) for key, value in data.get('entries', []))
+            self.dirty = False
+
+    def save(self):
+        """
+        将缓存写入文件，没有变化时跳过。
+        """
+        if not self.path or not self.dirty:
+            return
+        with self.lock:
+            data = {
+                "fingerprint": self.fingerprint,
+                "entries": [[key, list(value)] for key, value in self.entries.items()]
+            }
+            self.dirty = False
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"保存匹配缓存失败: {e}")
+
+    def validate(self, fingerprint):
+        """
+        歌曲库或匹配设置变化时清空缓存。
+        """
+        with self.lock:
+            if self.fingerprint != fingerprint:
+                self.fingerprint = fingerprint
+                self.entries.clear()
+                self.dirty = True
+
+    def get(self, title, artist, bidirectional=False):
+        """
+        返回缓存的 (歌曲 ID, 得分)，没有缓存时返回 None。
+        """
+        key = normalize_key(title, artist, bidirectional)
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, title, artist, song_id, score, bidirectional=False):
+        key = normalize_key(title, artist, bidirectional)
+        with self.lock:
+            self.entries[key] = (song_id, score)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            self.dirty = True
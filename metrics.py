@@ -0,0 +1,190 @@
+import json
+import time
+import threading
+import contextlib
+
+# 单首歌曲匹配耗时直方图的桶上限（秒）
+MATCH_LATENCY_BUCKETS = (0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+class Metrics:
+    """
+    导入流程的运行指标：
+    - 各阶段（获取平台歌单、获取歌曲库、匹配、创建歌单、添加歌曲等）的次数和耗时
+    - 按接口统计的请求数、错误数、重试次数、响应字节数和耗时
+    - 单首歌曲匹配耗时的直方图，按匹配路径区分
+    所有方法都可以在多个线程中调用。阶段可以嵌套，例如边获取边匹配时 fetch_library 包含在 match 中。
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        清空已记录的指标，开始新一轮统计。
+        """
+        with self.lock:
+            self.started_at = time.time()
+            self.stages = {}
+            self.requests = {}
+            self.histograms = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        记录一个阶段的耗时，可用作 with 语句或函数装饰器。
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - start)
+
+    def record_stage(self, name, elapsed):
+        with self.lock:
+            stat = self.stages.setdefault(name, {"count": 0, "total_time": 0.0, "max_time": 0.0, "last_time": 0.0})
+            stat['count'] += 1
+            stat['total_time'] += elapsed
+            stat['max_time'] = max(stat['max_time'], elapsed)
+            stat['last_time'] = elapsed
+
+    def _request_stat(self, endpoint):
+        return self.requests.setdefault(endpoint, {
+            "count": 0, "errors": 0, "retries": 0, "bytes": 0, "total_time": 0.0, "max_time": 0.0
+        })
+
+    def record_request(self, endpoint, elapsed, size=0, error=False, retries=0):
+        """
+        记录一次 HTTP 请求，retries 为请求层内部已经重试的次数。
+        """
+        with self.lock:
+            stat = self._request_stat(endpoint)
+            stat['count'] += 1
+            stat['bytes'] += size
+            stat['retries'] += retries
+            stat['total_time'] += elapsed
+            stat['max_time'] = max(stat['max_time'], elapsed)
+            if error:
+                stat['errors'] += 1
+
+    def record_retry(self, endpoint, count=1):
+        with self.lock:
+            self._request_stat(endpoint)['retries'] += count
+
+    def observe(self, name, value, count=1, label=None, buckets=MATCH_LATENCY_BUCKETS):
+        """
+        向直方图 name 中记录 count 个值为 value 的样本，label 用于区分同一直方图的不同序列（如匹配路径）。
+        """
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(label)
+            if histogram is None:
+                histogram = series[label] = {"buckets": list(buckets), "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(histogram['buckets']):
+                if value <= bound:
+                    histogram['counts'][i] += count
+                    break
+            histogram['sum'] += value * count
+            histogram['count'] += count
+
+    def report(self):
+        """
+        返回当前指标的字典，可直接序列化为 JSON。直方图的桶计数为累计值，与 Prometheus 一致。
+        """
+        with self.lock:
+            stages = {name: dict(stat) for name, stat in self.stages.items()}
+            requests = {endpoint: dict(stat) for endpoint, stat in self.requests.items()}
+            histograms = {}
+            for name, series in self.histograms.items():
+                histograms[name] = {}
+                for label, histogram in series.items():
+                    cumulative, buckets = 0, {}
+                    for bound, count in zip(histogram['buckets'], histogram['counts']):
+                        cumulative += count
+                        buckets[str(bound)] = cumulative
+                    buckets['+Inf'] = histogram['count']
+                    histograms[name][label or ''] = {
+                        "buckets": buckets,
+                        "sum": histogram['sum'],
+                        "count": histogram['count'],
+                        "avg": histogram['sum'] / histogram['count'] if histogram['count'] else 0.0
+                    }
+            started_at = self.started_at
+        for stat in list(stages.values()) + list(requests.values()):
+            stat['avg_time'] = stat['total_time'] / stat['count'] if stat['count'] else 0.0
+        return {
+            "started_at": time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(started_at)),
+            "elapsed": time.time() - started_at,
+            "stages": stages,
+            "requests": requests,
+            "histograms": histograms
+        }
+
+    def to_json(self, indent=2):
+        return json.dumps(self.report(), ensure_ascii=False, indent=indent)
+
+    def to_prometheus(self, prefix='tnos'):
+        """
+        以 Prometheus 文本格式导出指标。
+        """
+        report = self.report()
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = ",".join(f'{key}="{_escape_label(val)}"' for key, val in labels)
+                lines.append(f"{prefix}_{name}{suffix}{{{label_text}}} {value!r}" if label_text
+                             else f"{prefix}_{name}{suffix} {value!r}")
+
+        stages = report['stages']
+        family("stage_runs_total", "counter", "Number of times each stage ran.",
+               [("", [("stage", name)], stat['count']) for name, stat in stages.items()])
+        family("stage_seconds_total", "counter", "Total time spent in each stage.",
+               [("", [("stage", name)], stat['total_time']) for name, stat in stages.items()])
+        family("stage_seconds_max", "gauge", "Longest single run of each stage.",
+               [("", [("stage", name)], stat['max_time']) for name, stat in stages.items()])
+
+        requests = report['requests']
+        for key, name, help_text in (
+            ('count', "requests_total", "HTTP requests sent, including retried attempts."),
+            ('errors', "request_errors_total", "HTTP requests that failed."),
+            ('retries', "request_retries_total", "HTTP request retries."),
+            ('bytes', "response_bytes_total", "Response body bytes received."),
+            ('total_time', "request_seconds_total", "Total time spent waiting for responses."),
+        ):
+            family(name, "counter", help_text,
+                   [("", [("endpoint", endpoint)], stat[key]) for endpoint, stat in requests.items()])
+
+        for name, series in report['histograms'].items():
+            samples = []
+            for label, histogram in series.items():
+                labels = [("path", label)] if label else []
+                for bound, count in histogram['buckets'].items():
+                    samples.append(("_bucket", labels + [("le", bound)], count))
+                samples.append(("_sum", labels, histogram['sum']))
+                samples.append(("_count", labels, histogram['count']))
+            family(name, "histogram", f"Distribution of {name.replace('_', ' ')}.", samples)
+
+        return "\n".join(lines) + "\n"
+
+    def save(self, file_path, format='json'):
+        """
+        将指标写入文件，format 为 'json' 或 'prometheus'。
+        """
+        content = self.to_prometheus() if format == 'prometheus' else self.to_json()
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+def response_retries(response):
+    """
+    返回 requests 响应在 urllib3 重试层中已经重试的次数。
+    """
+    retries = getattr(response.raw, 'retries', None)
+    return len(retries.history) if retries is not None else 0
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# 进程内共用的指标，各模块直接记录到这里
+metrics = Metrics()
@@ -1,8 +1,44 @@
+import os
 import re
 import requests
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse, parse_qs
 
+from metrics import metrics, response_retries
+
+# 接口地址，可通过环境变量 TNOS_NETEASE_API_BASE 指向本地的模拟服务器
+API_BASE = os.environ.get("TNOS_NETEASE_API_BASE", "https://music.163.com").rstrip('/')
+PLAYLIST_DETAIL_URL = f"{API_BASE}/api/v6/playlist/detail"
+SONG_DETAIL_URL = f"{API_BASE}/api/v3/song/detail"
+# 歌单详情接口只返回前 1000 首的完整信息，其余歌曲按批查询歌曲详情
+DETAIL_BATCH_SIZE = 500
+# 同时请求的歌曲详情批数
+FETCH_WORKERS = 8
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "Content-Type": "application/x-www-form-urlencoded",
+    "Referer": "https://music.163.com/",
+    "Origin": "https://music.163.com",
+    "Cookie": "os=pc"
+}
+
+def _build_session():
+    session = requests.Session()
+    retries = requests.adapters.Retry(total=5, backoff_factor=1, status_forcelist=[500, 502, 503, 504],
+                                      allowed_methods=None)
+    adapter = requests.adapters.HTTPAdapter(pool_connections=FETCH_WORKERS, pool_maxsize=FETCH_WORKERS,
+                                            max_retries=retries)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(HEADERS)
+    return session
+
+# 模块内所有请求共用一个连接池
+session = _build_session()
+
 def extract_netease_playlist_id(link):
     """
     从网易云音乐歌单链接中提取歌单 ID。
@@ -36,7 +72,7 @@ def extract_netease_playlist_id(link):
     if 't.cn' in parsed_url.netloc:
         print("处理 NetEase 短链接，尝试重定向解析")
         try:
-            response = requests.head(link, allow_redirects=True, timeout=5)
+            response = session.head(link, allow_redirects=True, timeout=5)
             print(f"重定向到: {response.url}")
             return extract_netease_playlist_id(response.url)
         except requests.RequestException as e:
@@ -46,42 +82,101 @@ def extract_netease_playlist_id(link):
     print("无法提取 NetEase 歌单 ID。")
     return None
 
-def get_netease_playlist_details(playlist_id):
+def _post_json(url, data, action, label):
     """
-    通过网易云音乐歌单 ID 获取歌单详情，包括歌曲名称和作者。
+    发送 POST 请求并解析 JSON，失败时输出错误信息并返回 None。
+    请求的耗时、字节数和重试次数按 label 记录到 metrics。
     """
-    url = "https://music.163.com/api/v6/playlist/detail"
-    headers = {
-        "User-Agent": "Mozilla/5.0",
-        "Content-Type": "application/x-www-form-urlencoded",
-        "Referer": "https://music.163.com/",
-        "Origin": "https://music.163.com",
-        "Cookie": "os=pc"
-    }
-    data = {
-        "id": playlist_id,
-        "n": "1000"
-    }
-
+    start = time.perf_counter()
     try:
-        response = requests.post(url, headers=headers, data=data, timeout=10)
+        response = session.post(url, data=data, timeout=10)
         response.raise_for_status()
     except requests.RequestException as e:
-        print(f"NetEase HTTP 请求失败: {e}")
+        metrics.record_request(label, time.perf_counter() - start, error=True)
+        print(f"NetEase {action} HTTP 请求失败: {e}")
         return None
+    metrics.record_request(label, time.perf_counter() - start, len(response.content),
+                           retries=response_retries(response))
 
     try:
-        playlist_json = response.json()
+        result = response.json()
     except json.JSONDecodeError as e:
-        print(f"NetEase 解析 JSON 失败: {e}")
+        print(f"NetEase {action} 解析 JSON 失败: {e}")
         return None
 
-    if playlist_json.get("code") != 200:
-        print(f"NetEase API 返回错误: {playlist_json.get('msg', '未知错误')}")
+    if result.get("code") != 200:
+        print(f"NetEase {action} API 返回错误: {result.get('msg', '未知错误')}")
         return None
 
+    return result
+
+def get_netease_song_details(song_ids):
+    """
+    按批查询歌曲详情，各批并发请求，返回 {歌曲 ID: 歌曲信息}。
+    查询失败的批次会被跳过。
+    """
+    batches = [song_ids[i:i + DETAIL_BATCH_SIZE] for i in range(0, len(song_ids), DETAIL_BATCH_SIZE)]
+    if not batches:
+        return {}
+
+    def fetch(batch):
+        return _post_json(SONG_DETAIL_URL, {
+            "c": json.dumps([{"id": song_id} for song_id in batch])
+        }, "获取歌曲详情", "netease.song_detail")
+
+    tracks = {}
+    with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(batches))) as executor:
+        for result in executor.map(fetch, batches):
+            if result is None:
+                continue
+            for track in result.get("songs", []):
+                tracks[track.get("id")] = track
+    return tracks
+
+def get_netease_playlist_details(playlist_id):
+    """
+    通过网易云音乐歌单 ID 获取歌单详情，包括歌曲名称和作者。
+    tracks 中缺少的歌曲会根据 trackIds 补全，并按 trackIds 的顺序排列。
+    """
+    data = {
+        "id": playlist_id,
+        "n": "1000"
+    }
+
+    playlist_json = _post_json(PLAYLIST_DETAIL_URL, data, "获取歌单详情", "netease.playlist_detail")
+    if playlist_json is None:
+        return None
+
+    playlist = playlist_json.get("playlist") or {}
+    track_ids = [item.get("id") for item in playlist.get("trackIds") or []]
+    tracks = {track.get("id"): track for track in playlist.get("tracks") or []}
+    missing_ids = [song_id for song_id in track_ids if song_id not in tracks]
+    if missing_ids:
+        print(f"NetEase 歌单共 {len(track_ids)} 首，补充获取 {len(missing_ids)} 首歌曲详情")
+        tracks.update(get_netease_song_details(missing_ids))
+        playlist["tracks"] = [tracks[song_id] for song_id in track_ids if song_id in tracks]
+
     return playlist_json
 
+def netease_playlist_version(playlist):
+    """
+    根据歌单的更新时间和歌曲数生成版本标识，用于判断缓存是否过期。
+    """
+    return f"{playlist.get('updateTime')}:{playlist.get('trackUpdateTime')}:{playlist.get('trackCount')}"
+
+def get_netease_playlist_version(playlist_id):
+    """
+    只请求歌单元数据（不含歌曲详情），返回版本标识，失败时返回 None。
+    """
+    playlist_json = _post_json(PLAYLIST_DETAIL_URL, {
+        "id": playlist_id,
+        "n": "0",
+        "s": "0"
+    }, "获取歌单版本", "netease.playlist_detail")
+    if playlist_json is None or not playlist_json.get("playlist"):
+        return None
+    return netease_playlist_version(playlist_json["playlist"])
+
 def extract_netease_songs(playlist_json):
     """
     从网易云音乐歌单详情 JSON 数据中提取歌曲名称和作者信息。
@@ -0,0 +1,70 @@
+import os
+import json
+import time
+
+from utils import get_cache_dir, cache_key
+
+# 缓存有效期（秒），期内重复导入同一歌单不再请求平台接口
+PLAYLIST_CACHE_TTL = 3600
+
+def playlist_cache_path(platform, playlist_id):
+    """
+    返回指定平台歌单的缓存文件路径。
+    """
+    cache_dir = os.path.join(get_cache_dir(), "playlists")
+    os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, f"{platform}_{cache_key(platform, playlist_id)}.json")
+
+def load_playlist_cache(platform, playlist_id):
+    """
+    读取歌单缓存，返回包含 name、songs、version、saved_at 的字典，不存在或损坏时返回 None。
+    """
+    path = playlist_cache_path(platform, playlist_id)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"读取歌单缓存失败: {e}")
+        return None
+    if data.get('platform') != platform or data.get('playlist_id') != str(playlist_id):
+        return None
+    return data
+
+def save_playlist_cache(platform, playlist_id, name, songs, version=None):
+    """
+    保存歌单名称和歌曲列表，version 为平台提供的更新时间等版本信息，先写临时文件再替换。
+    """
+    path = playlist_cache_path(platform, playlist_id)
+    data = {
+        "platform": platform,
+        "playlist_id": str(playlist_id),
+        "saved_at": time.time(),
+        "version": version,
+        "name": name,
+        "songs": songs
+    }
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"保存歌单缓存失败: {e}")
+        return False
+    return True
+
+def touch_playlist_cache(entry):
+    """
+    平台确认歌单未变化时，刷新缓存的保存时间。
+    """
+    return save_playlist_cache(entry['platform'], entry['playlist_id'], entry['name'],
+                               entry['songs'], entry.get('version'))
+
+def is_cache_fresh(entry, ttl=None):
+    """
+    判断缓存是否仍在有效期内。
+    """
+    ttl = PLAYLIST_CACHE_TTL if ttl is None else ttl
+    return time.time() - entry.get('saved_at', 0) < ttl
@@ -1,25 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from audiostation import parse_song_entry
 from utils import detect_platform
-from netease_music import extract_netease_playlist_id, get_netease_playlist_details, extract_netease_songs
-from qqmusic import extract_qqmusic_playlist_id, QQMusicList
+from playlist_cache import load_playlist_cache, save_playlist_cache, touch_playlist_cache, is_cache_fresh
+from metrics import metrics
 
-def fetch_song_list_from_link(link):
+def _load_cached_song_list(platform, playlist_id, cache_ttl=None):
+    """
+    返回可直接使用的缓存歌单 (名称, 歌曲列表)，缓存不存在或已失效时返回 None。
+    缓存过期后，网易云音乐歌单先查询更新时间，未变化则继续使用缓存。
+    """
+    entry = load_playlist_cache(platform, playlist_id)
+    if not entry or not entry.get('songs'):
+        return None
+    if not is_cache_fresh(entry, cache_ttl):
+        if platform != 'netease' or not entry.get('version'):
+            return None
+        from netease_music import get_netease_playlist_version
+        if get_netease_playlist_version(playlist_id) != entry['version']:
+            return None
+        touch_playlist_cache(entry)
+    print(f"使用缓存的歌单: {entry['name']}（{len(entry['songs'])} 首）")
+    return entry['name'], entry['songs']
+
+@metrics.stage('fetch_playlist')
+def fetch_song_list_from_link(link, use_cache=True, cache_ttl=None):
     """
     根据链接自动提取歌曲列表。
     支持网易云音乐和 QQ 音乐。
     返回歌单名称和歌曲列表。
+    use_cache 为 True 时优先使用本地缓存，cache_ttl 为缓存有效期（秒），默认为 PLAYLIST_CACHE_TTL。
     """
     platform = detect_platform(link)
     if not platform:
         print("无法识别链接所属平台。请确保链接来自网易云音乐或 QQ 音乐。")
         return None, []
 
+    # 平台模块在导入对应平台的歌单时才加载
     if platform == 'netease':
+        from netease_music import (extract_netease_playlist_id, get_netease_playlist_details,
+                                   extract_netease_songs, netease_playlist_version)
         playlist_id = extract_netease_playlist_id(link)
         if not playlist_id:
             print("未能提取到网易云音乐歌单 ID。")
             return None, []
         print(f"提取到网易云音乐歌单 ID: {playlist_id}")
 
+        cached = _load_cached_song_list(platform, playlist_id, cache_ttl) if use_cache else None
+        if cached:
+            return cached
+
         playlist_json = get_netease_playlist_details(playlist_id)
         if not playlist_json:
             print("未能获取网易云音乐歌单详情。")
@@ -31,14 +61,21 @@ def fetch_song_list_from_link(link):
             return None, []
 
         playlist_name = playlist_json['playlist'].get('name', '未知歌单')
+        version = netease_playlist_version(playlist_json['playlist'])
+        expected = len(playlist_json['playlist'].get('trackIds') or []) or playlist_json['playlist'].get('trackCount')
 
     elif platform == 'qqmusic':
+        from qqmusic import extract_qqmusic_playlist_id, QQMusicList
         playlist_id = extract_qqmusic_playlist_id(link)
         if not playlist_id:
             print("未能提取到 QQ 音乐歌单 ID。")
             return None, []
         print(f"提取到 QQ 音乐歌单 ID: {playlist_id}")
 
+        cached = _load_cached_song_list(platform, playlist_id, cache_ttl) if use_cache else None
+        if cached:
+            return cached
+
         qqmusic = QQMusicList(playlist_id)
         songs = qqmusic.get_list()
         if not songs:
@@ -46,5 +83,84 @@ def fetch_song_list_from_link(link):
             return None, []
 
         playlist_name = "QQMusic 导入歌单"
+        version = None
+        expected = qqmusic.total
+
+    # 部分页面或批次获取失败时歌单不完整，不写入缓存，下次导入重新获取
+    if expected and len(songs) == expected:
+        save_playlist_cache(platform, playlist_id, playlist_name, songs, version)
+    else:
+        print(f"歌单只获取到 {len(songs)}/{expected or '未知'} 首歌曲，本次结果不写入缓存。")
+    return playlist_name, songs
+
+@metrics.stage('batch_import')
+def import_playlists_from_links(client, items, threshold=70, log_func=None, fetch_workers=4, import_workers=4):
+    """
+    批量导入多个平台歌单，items 为 [(链接, 歌单名称), ...]，名称为空时使用平台歌单名。
+    平台歌单并发获取，全部歌单共用客户端的同一个歌曲索引依次匹配，
+    创建和填充 AudioStation 歌单最多同时进行 import_workers 个。
+    返回与输入顺序一致的结果列表，每项为包含 link、name、status、playlist_id、total、matched、stats 的字典，
+    status 为 'ok'、'fetch_failed'、'no_match'、'create_failed' 或 'add_failed'。
+    """
+    summaries = [{
+        "link": link,
+        "name": name,
+        "status": None,
+        "playlist_id": None,
+        "total": 0,
+        "matched": 0,
+        "stats": {}
+    } for link, name in items]
+
+    def import_one(summary, song_ids):
+        playlist_id = client.create_playlist(summary['name'], log_func)
+        if not playlist_id:
+            summary['status'] = 'create_failed'
+            return
+        summary['playlist_id'] = playlist_id
+        if client.add_songs_to_playlist(playlist_id, song_ids, log_func):
+            summary['status'] = 'ok'
+        else:
+            summary['status'] = 'add_failed'
+
+    with ThreadPoolExecutor(max_workers=max(1, fetch_workers)) as fetch_executor, \
+            ThreadPoolExecutor(max_workers=max(1, import_workers)) as import_executor:
+        fetches = [fetch_executor.submit(fetch_song_list_from_link, link) for link, _ in items]
+
+        # 平台歌单获取期间准备歌曲库，所有歌单共用同一个索引
+        if not client.all_songs_cache:
+            if not client.fetch_all_songs(log_func):
+                for summary in summaries:
+                    summary['status'] = 'fetch_failed'
+                return summaries
+
+        imports = []
+        for n, (summary, future) in enumerate(zip(summaries, fetches), 1):
+            playlist_name, song_list = future.result()
+            if not song_list:
+                summary['status'] = 'fetch_failed'
+                if log_func:
+                    log_func(f"[{n}/{len(items)}] 无法获取歌单: {summary['link']}")
+                continue
+            summary['name'] = summary['name'] or playlist_name
+            if log_func:
+                log_func(f"[{n}/{len(items)}] 正在匹配歌单: {summary['name']}")
+
+            song_entries = [entry for entry in map(parse_song_entry, song_list) if entry]
+            song_ids = client.match_song_entries(song_entries, threshold, log_func)
+            summary['total'] = len(song_list)
+            summary['matched'] = len(song_ids)
+            summary['stats'] = dict(client.match_stats)
+            if not song_ids:
+                summary['status'] = 'no_match'
+                continue
+            imports.append(import_executor.submit(import_one, summary, song_ids))
+
+        for future in imports:
+            future.result()
 
-    return playlist_name, songs
\ No newline at end of file
+    succeeded = sum(1 for summary in summaries if summary['status'] == 'ok')
+    print(f"批量导入完成: 成功 {succeeded}/{len(summaries)} 个歌单")
+    if log_func:
+        log_func(f"批量导入完成: 成功 {succeeded}/{len(summaries)} 个歌单")
+    return summaries
@@ -1,9 +1,13 @@
+import os
 import re
 import time
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse, parse_qs
 
+from metrics import metrics, response_retries
+
 def extract_qqmusic_playlist_id(link):
     """
     从 QQ 音乐歌单链接中提取歌单 ID。
@@ -37,9 +41,19 @@ def extract_qqmusic_playlist_id(link):
     print("无法提取 QQMusic 歌单 ID。")
     return None
 
+# 歌单接口地址，可通过环境变量 TNOS_QQMUSIC_API_BASE 指向本地的模拟服务器
+API_BASE = os.environ.get("TNOS_QQMUSIC_API_BASE", "https://c.y.qq.com").rstrip('/')
+CDINFO_URL = f"{API_BASE}/qzone/fcg-bin/fcg_ucc_getcdinfo_byids_cp.fcg"
+# 单次请求的歌曲数，接口实际返回的数量可能更少
+PAGE_SIZE = 1000
+# 同时请求的页数
+FETCH_WORKERS = 8
+
 class QQMusicList():
     def __init__(self, id):
         self.id = id
+        # get_list 读取到的总歌曲数，可与获取到的歌曲数比较判断是否有页面获取失败
+        self.total = 0
         self.headers = {
             "User-Agent": "Mozilla/5.0",
             "Referer": f"https://y.qq.com/w/taoge.html?ADTAG=profile_h5&id={self.id}",
@@ -49,100 +63,117 @@ class QQMusicList():
         }
         self.session = requests.Session()
         retries = requests.adapters.Retry(total=5, backoff_factor=1, status_forcelist=[500, 502, 503, 504])
-        adapter = requests.adapters.HTTPAdapter(max_retries=retries)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=FETCH_WORKERS, pool_maxsize=FETCH_WORKERS,
+                                                max_retries=retries)
         self.session.mount('http://', adapter)
         self.session.mount('https://', adapter)
 
-    def total_song_num(self):
+    def _fetch_cd(self, song_begin, song_num):
         """
-        获取 QQ 音乐歌单的总歌曲数。
+        请求歌单接口的一页，返回歌单信息（cdlist 的第一项），失败时返回 None。
         """
-        url = f"https://y.qq.com/n/m/detail/taoge/index.html"
         params = {
-            "ADTAG": "profile_h5",
-            "id": self.id
+            "_": int(time.time() * 1000)
+        }
+        postdata = {
+            "format": "json",
+            "inCharset": "utf-8",
+            "outCharset": "utf-8",
+            "notice": "0",
+            "platform": "h5",
+            "needNewCode": "1",
+            "new_format": "1",
+            "pic": "500",
+            "disstid": self.id,
+            "type": "1",
+            "json": "1",
+            "utf8": "1",
+            "onlysong": "0",
+            "nosign": "1",
+            "song_begin": song_begin,
+            "song_num": song_num,
         }
-        method = "GET"
+        start = time.perf_counter()
         try:
-            resp = self.session.request(method, url, params=params, headers=self.headers, timeout=10)
+            resp = self.session.post(CDINFO_URL, headers=self.headers, params=params, data=postdata, timeout=10)
             resp.raise_for_status()
         except requests.RequestException as e:
-            print(f"QQMusic 获取总歌曲数请求失败: {e}")
-            return 0
-        match = re.search(r"共(\d+)首", resp.text)
-        if match:
+            metrics.record_request("qqmusic.cdinfo", time.perf_counter() - start, error=True)
+            print(f"QQMusic {song_begin} 页数获取失败: {e}")
+            return None
+        metrics.record_request("qqmusic.cdinfo", time.perf_counter() - start, len(resp.content),
+                               retries=response_retries(resp))
+        try:
+            data = resp.json()
+        except json.JSONDecodeError as e:
+            print(f"QQMusic JSON 解析失败: {e}")
+            print(f"QQMusic 响应内容: {resp.text}")
+            return None
+        cdlist = data.get("cdlist")
+        if not cdlist:
+            print(f"QQMusic 缺少 'cdlist' 键，响应内容: {data}")
+            return None
+        return cdlist[0]
+
+    @staticmethod
+    def _cd_total(cd):
+        """
+        从歌单信息中读取总歌曲数。
+        """
+        for key in ("total_song_num", "songnum"):
             try:
-                total_song_num = int(match.group(1))
-                print(f"QQMusic 总歌曲数: {total_song_num}")
-                return total_song_num
-            except ValueError:
-                print("QQMusic 无法将总歌曲数转换为整数。")
-                return 0
-        else:
-            print("QQMusic 未能找到总歌曲数。")
-            return 0
+                total = int(cd.get(key) or 0)
+            except (TypeError, ValueError):
+                continue
+            if total:
+                return total
+        return 0
+
+    @staticmethod
+    def _parse_songs(cd, song_begin):
+        """
+        将一页歌单信息转换为 "歌曲名 - 歌手" 列表。
+        """
+        songlist = cd.get("songlist")
+        if not songlist:
+            print(f"QQMusic {song_begin} 页缺少 'songlist' 键")
+            return []
+        songs = []
+        for song in songlist:
+            name = song.get("name", "未知歌曲")
+            singer_info = song.get("singer")
+            if not singer_info:
+                singer = "未知歌手"
+            else:
+                singer = singer_info[0].get("name", "未知歌手")
+            songs.append(f"{name} - {singer}")
+        return songs
 
     def get_list(self):
         """
         获取 QQ 音乐歌单的歌曲列表。
+        第一页同时带回总歌曲数，其余页面并发请求，结果按歌单顺序拼接。
         """
         song_list = []
-        url = "https://c.y.qq.com/qzone/fcg-bin/fcg_ucc_getcdinfo_byids_cp.fcg"
-        total_song_num = self.total_song_num()
+        first_cd = self._fetch_cd(0, PAGE_SIZE)
+        if first_cd is None:
+            return song_list
+        total_song_num = self._cd_total(first_cd)
+        self.total = total_song_num
         if total_song_num == 0:
             print("QQMusic 总歌曲数为0，无法获取歌曲列表。")
             return song_list
-        for song_begin in range(0, total_song_num, 15):
-            params = {
-                "_": int(time.time() * 1000)
-            }
-            postdata = {
-                "format": "json",
-                "inCharset": "utf-8",
-                "outCharset": "utf-8",
-                "notice": "0",
-                "platform": "h5",
-                "needNewCode": "1",
-                "new_format": "1",
-                "pic": "500",
-                "disstid": self.id,
-                "type": "1",
-                "json": "1",
-                "utf8": "1",
-                "onlysong": "0",
-                "nosign": "1",
-                "song_begin": song_begin,
-                "song_num": "15",
-            }
-            try:
-                resp = self.session.post(url, headers=self.headers, params=params, data=postdata, timeout=10)
-                resp.raise_for_status()
-            except requests.RequestException as e:
-                print(f"QQMusic {song_begin} 页数获取失败: {e}")
-                continue
-            try:
-                data = resp.json()
-            except json.JSONDecodeError as e:
-                print(f"QQMusic JSON 解析失败: {e}")
-                print(f"QQMusic 响应内容: {resp.text}")
-                continue
-            cdlist = data.get("cdlist")
-            if not cdlist:
-                print(f"QQMusic 缺少 'cdlist' 键，响应内容: {data}")
-                continue
-            cd = cdlist[0]
-            songlist = cd.get("songlist")
-            if not songlist:
-                print(f"QQMusic 缺少 'songlist' 键，响应内容: {cd}")
-                continue
-            for song in songlist:
-                name = song.get("name", "未知歌曲")
-                singer_info = song.get("singer")
-                if not singer_info:
-                    singer = "未知歌手"
-                else:
-                    singer = singer_info[0].get("name", "未知歌手")
-                sony_name = f"{name} - {singer}"
-                print(sony_name)
-                song_list.append(sony_name)
-        return song_list
\ No newline at end of file
+        print(f"QQMusic 总歌曲数: {total_song_num}")
+        song_list.extend(self._parse_songs(first_cd, 0))
+
+        # 服务器单页上限可能小于 PAGE_SIZE，以第一页实际返回的数量作为步长
+        step = len(first_cd.get("songlist") or [])
+        offsets = list(range(step, total_song_num, step)) if step else []
+        if offsets:
+            with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(offsets))) as executor:
+                cds = executor.map(lambda song_begin: self._fetch_cd(song_begin, step), offsets)
+                for song_begin, cd in zip(offsets, cds):
+                    if cd is not None:
+                        song_list.extend(self._parse_songs(cd, song_begin))
+        print(f"QQMusic 获取到 {len(song_list)} 首歌曲")
+        return song_list
@@ -0,0 +1,359 @@
+import re
+import heapq
+import multiprocessing
+from collections import Counter
+
+# fuzzywuzzy、numpy 和 rapidfuzz 导入较慢，在第一次匹配时才加载
+fuzz = None
+fuzz_utils = None
+np = None
+rf_fuzz = None
+rf_process = None
+_batch_checked = False
+
+ARTIST_SEPARATORS = r'[、/，,]'
+
+# 中日韩文字没有空格分词，按字符二元组建立倒排索引；其他文字按单词建立
+CJK_CHARS = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+TOKEN_PATTERN = re.compile(f'([{CJK_CHARS}]+)|([^\\W_{CJK_CHARS}]+)')
+
+def load_fuzz():
+    """
+    加载 fuzzywuzzy，重复调用不会重新导入。
+    """
+    global fuzz, fuzz_utils
+    if fuzz is None:
+        from fuzzywuzzy import fuzz as fuzz_module, utils as utils_module
+        fuzz_utils = utils_module
+        fuzz = fuzz_module
+    return fuzz
+
+def batch_matching_available():
+    """
+    批量匹配依赖 rapidfuzz 和 numpy，未安装时退回逐首匹配。
+    """
+    global np, rf_fuzz, rf_process, _batch_checked
+    if not _batch_checked:
+        try:
+            import numpy
+            from rapidfuzz import fuzz as rf_fuzz_module, process as rf_process_module
+        except ImportError:
+            pass
+        else:
+            load_fuzz()
+            np = numpy
+            rf_fuzz = rf_fuzz_module
+            rf_process = rf_process_module
+        _batch_checked = True
+    return rf_process is not None
+
+def normalize_text(text):
+    """
+    转小写并合并空白，用于精确匹配和缓存键。
+    """
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+def split_artists(artist):
+    """
+    按常见分隔符拆分多个歌手。
+    """
+    return [a.strip() for a in re.split(ARTIST_SEPARATORS, artist.lower())]
+
+def index_keys(text):
+    """
+    将文本拆分为倒排索引的键：拉丁文字取单词，中日韩文字取字符二元组。
+    """
+    keys = set()
+    for cjk, word in TOKEN_PATTERN.findall(text.lower()):
+        if cjk:
+            if len(cjk) == 1:
+                keys.add(cjk)
+            else:
+                keys.update(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        elif len(word) > 1 or word.isdigit():
+            keys.add(word)
+    return keys
+
+class SongIndex:
+    """
+    歌曲库的预处理索引。
+    在歌曲缓存更新时构建一次，匹配时直接复用，避免每次匹配都重新生成候选列表。
+    同时维护标题和歌手的倒排索引，用于在模糊打分前筛选候选歌曲。
+    """
+    def __init__(self, songs=None, max_key_postings=5000):
+        self.ids = []
+        self.titles = []
+        self.artists = []
+        self.postings = {}
+        # 精确匹配用的哈希表：归一化的 "标题\t歌手" 和归一化的标题分别映射到歌曲位置
+        self.exact_keys = {}
+        self.title_keys = {}
+        # 批量匹配用的预处理文本，首次批量匹配时生成
+        self._processed = None
+        # 命中歌曲过多的键（如 "the"、"的"）区分度很低，筛选时跳过
+        self.max_key_postings = max_key_postings
+        if songs:
+            self.add_songs(songs)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add_songs(self, songs):
+        """
+        将歌曲追加到索引中，歌曲格式与 AudioStation Song list 接口返回一致。
+        """
+        for song in songs:
+            pos = len(self.ids)
+            title = song.get('title', '').lower()
+            artist = song.get('additional', {}).get('song_tag', {}).get('artist', '').lower()
+            self.ids.append(song['id'])
+            self.titles.append(title)
+            self.artists.append(artist)
+            for key in index_keys(title) | index_keys(artist):
+                self.postings.setdefault(key, []).append(pos)
+            normalized_title = normalize_text(title)
+            self.title_keys.setdefault(normalized_title, []).append(pos)
+            for part in {normalize_text(artist)} | {normalize_text(a) for a in split_artists(artist)}:
+                self.exact_keys.setdefault(f"{normalized_title}\t{part}", pos)
+        self._processed = None
+
+    def shortlist(self, title, artist, limit=300):
+        """
+        通过倒排索引找出与输入共享最多键的歌曲位置，最多返回 limit 个。
+        """
+        keys = index_keys(title) | index_keys(artist)
+        postings = [self.postings[key] for key in keys if key in self.postings]
+        selective = [p for p in postings if len(p) <= self.max_key_postings]
+        hits = Counter()
+        for positions in (selective or postings):
+            hits.update(positions)
+        if len(hits) <= limit:
+            return sorted(hits)
+        return sorted(pos for pos, _ in heapq.nlargest(limit, hits.items(), key=lambda item: item[1]))
+
+    def match(self, title, artist, shortlist_size=None, full_scan_fallback=True, bidirectional=False):
+        """
+        在索引中查找与 (title, artist) 最相似的歌曲。
+        shortlist_size: 先用倒排索引筛选的候选数量，None 表示直接全量比对
+        full_scan_fallback: 筛选结果为空时是否退回全量比对
+        bidirectional: 同时按 "歌手 - 歌曲名" 打分，每首候选歌曲取两种方向中较高的得分
+        返回 (最佳匹配的位置, 得分)，没有候选时位置为 None。
+        """
+        load_fuzz()
+        input_title = title.strip().lower()
+        orientations = [(input_title, split_artists(artist))]
+        if bidirectional:
+            orientations.append((artist.strip().lower(), split_artists(title)))
+
+        if shortlist_size:
+            positions = self.shortlist(input_title, artist, shortlist_size)
+            if not positions and full_scan_fallback:
+                positions = range(len(self.ids))
+        else:
+            positions = range(len(self.ids))
+
+        best_pos = None
+        highest_score = 0
+
+        for pos in positions:
+            combined_score = 0
+            for query_title, query_artists in orientations:
+                title_score, artist_score = self._score(pos, query_title, query_artists)
+                combined_score = max(combined_score, (title_score * 0.7) + (artist_score * 0.3))
+
+            if combined_score > highest_score:
+                highest_score = combined_score
+                best_pos = pos
+
+        return best_pos, highest_score
+
+    def _score(self, pos, input_title, input_artists):
+        """
+        返回指定歌曲的 (标题得分, 歌手得分)
+        """
+        title_score = fuzz.token_set_ratio(input_title, self.titles[pos])
+        artist_score = max(fuzz.token_set_ratio(a, self.artists[pos]) for a in input_artists)
+        return title_score, artist_score
+
+    def exact_match(self, title, artist, threshold):
+        """
+        通过哈希表直接查找归一化后标题和歌手完全一致的歌曲，其次查找标题完全一致的歌曲。
+        只按标题命中时，要求组合得分和歌手得分都达到阈值，避免同名不同歌手的歌曲被误选。
+        返回 (位置, 得分, 'exact' 或 'title')，没有命中时返回 None。
+        """
+        load_fuzz()
+        normalized_title = normalize_text(title)
+        input_title = title.strip().lower()
+        input_artists = split_artists(artist)
+        for part in [normalize_text(artist)] + [normalize_text(a) for a in input_artists]:
+            pos = self.exact_keys.get(f"{normalized_title}\t{part}")
+            if pos is not None:
+                title_score, artist_score = self._score(pos, input_title, input_artists)
+                combined_score = (title_score * 0.7) + (artist_score * 0.3)
+                if combined_score >= threshold:
+                    return pos, combined_score, 'exact'
+
+        best = None
+        for pos in self.title_keys.get(normalized_title, []):
+            title_score, artist_score = self._score(pos, input_title, input_artists)
+            combined_score = (title_score * 0.7) + (artist_score * 0.3)
+            if artist_score >= threshold and combined_score >= threshold and (best is None or combined_score > best[1]):
+                best = (pos, combined_score, 'title')
+        return best
+
+    def exact_full_match(self, title, artist, threshold):
+        """
+        只按归一化后的完整 "标题\t歌手" 查找，命中且得分达到阈值时返回 (位置, 得分, 'exact')，否则返回 None。
+        这是 exact_match 最先检查的键，追加歌曲不会改变它对应的位置，
+        因此在获取歌曲库的过程中命中的结果与在完整索引上调用 exact_match 一致。
+        """
+        load_fuzz()
+        pos = self.exact_keys.get(f"{normalize_text(title)}\t{normalize_text(artist)}")
+        if pos is None:
+            return None
+        title_score, artist_score = self._score(pos, title.strip().lower(), split_artists(artist))
+        combined_score = (title_score * 0.7) + (artist_score * 0.3)
+        if combined_score >= threshold:
+            return pos, combined_score, 'exact'
+        return None
+
+    def prepare_batch(self):
+        """
+        生成批量匹配用的预处理文本
+        """
+        if self._processed is None and batch_matching_available():
+            self._processed = (
+                [fuzz_utils.full_process(t, force_ascii=True) for t in self.titles],
+                [fuzz_utils.full_process(a, force_ascii=True) for a in self.artists]
+            )
+
+    def match_batch(self, queries, shortlist_size=None, full_scan_fallback=True, bidirectional=False,
+                    chunk_size=64, workers=1):
+        """
+        批量匹配多首歌曲，queries 为 [(title, artist), ...]。
+        使用 rapidfuzz.process.cdist 计算标题/歌手得分矩阵，每首歌曲只与自己的候选歌曲比对，
+        加权方式与 match 相同（标题 0.7，歌手 0.3），结果与逐首调用 match 一致，返回 [(位置, 得分), ...]。
+        """
+        if not batch_matching_available():
+            return [self.match(title, artist, shortlist_size, full_scan_fallback, bidirectional) for title, artist in queries]
+
+        self.prepare_batch()
+        results = [(None, 0)] * len(queries)
+        if not self.ids:
+            return results
+
+        # 筛选为空的歌曲按块全量比对；有筛选结果的歌曲逐首只与自己的候选列比对，
+        # 合并候选列会让每行多比对上万列，且结果受同一块中其他歌曲影响
+        full_scan = []
+        shortlisted = []
+        for i, (title, artist) in enumerate(queries):
+            if not shortlist_size:
+                full_scan.append(i)
+                continue
+            positions = self.shortlist(title.strip().lower(), artist, shortlist_size)
+            if positions:
+                shortlisted.append((i, positions))
+            elif full_scan_fallback:
+                full_scan.append(i)
+
+        all_positions = np.arange(len(self.ids))
+        for start in range(0, len(full_scan), chunk_size):
+            block = full_scan[start:start + chunk_size]
+            self._score_block(queries, block, all_positions, results, bidirectional, workers)
+        for i, positions in shortlisted:
+            self._score_block(queries, [i], np.asarray(positions), results, bidirectional, workers)
+        return results
+
+    def _score_block(self, queries, block, columns, results, bidirectional, workers):
+        """
+        计算一组歌曲对指定候选列的得分矩阵，并把每行最佳结果写入 results。
+        """
+        titles_processed, artists_processed = self._processed
+        column_titles = [titles_processed[pos] for pos in columns]
+        column_artists = [artists_processed[pos] for pos in columns]
+
+        forward = [(title.strip().lower(), split_artists(artist)) for title, artist in (queries[i] for i in block)]
+        title_scores, artist_scores = self._score_matrices(forward, column_titles, column_artists, workers)
+        # 用整数加权避免浮点误差影响排序，argmax 取第一个最大值，与逐首匹配的规则一致
+        combined = title_scores * 7 + artist_scores * 3
+        if bidirectional:
+            swapped = [(artist.strip().lower(), split_artists(title)) for title, artist in (queries[i] for i in block)]
+            swapped_titles, swapped_artists = self._score_matrices(swapped, column_titles, column_artists, workers)
+            swapped_combined = swapped_titles * 7 + swapped_artists * 3
+            # 每首候选歌曲取得分较高的方向，相同时保留正向
+            use_swapped = swapped_combined > combined
+            combined = np.where(use_swapped, swapped_combined, combined)
+            title_scores = np.where(use_swapped, swapped_titles, title_scores)
+            artist_scores = np.where(use_swapped, swapped_artists, artist_scores)
+
+        best_columns = combined.argmax(axis=1)
+        for row, i in enumerate(block):
+            col = best_columns[row]
+            if combined[row, col] <= 0:
+                continue
+            score = int(title_scores[row, col]) * 0.7 + int(artist_scores[row, col]) * 0.3
+            results[i] = (int(columns[col]), score)
+
+    def _score_matrices(self, inputs, column_titles, column_artists, workers):
+        """
+        inputs 为 [(标题, [歌手, ...]), ...]，返回标题得分矩阵和歌手得分矩阵（多个歌手取最高分）
+        """
+        query_titles = []
+        query_artists = []
+        artist_starts = []
+        for title, artists in inputs:
+            query_titles.append(fuzz_utils.full_process(title, force_ascii=True))
+            artist_starts.append(len(query_artists))
+            for a in artists:
+                query_artists.append(fuzz_utils.full_process(a, force_ascii=True))
+
+        title_scores = np.rint(rf_process.cdist(
+            query_titles, column_titles, scorer=rf_fuzz.token_set_ratio,
+            processor=None, dtype=np.float32, workers=workers
+        )).astype(np.int16)
+        artist_scores = np.rint(rf_process.cdist(
+            query_artists, column_artists, scorer=rf_fuzz.token_set_ratio,
+            processor=None, dtype=np.float32, workers=workers
+        )).astype(np.int16)
+        # 每首歌可能有多个歌手，取其中最高的歌手得分
+        artist_scores = np.maximum.reduceat(artist_scores, artist_starts, axis=0)
+        return title_scores, artist_scores
+
+
+# 子进程中使用的歌曲索引。平台默认以 fork 启动时直接继承父进程内存（写时复制），
+# 其他启动方式通过进程池的 initializer 在每个子进程中只传递一次
+_worker_index = None
+
+def _init_worker(index):
+    global _worker_index
+    _worker_index = index
+
+def _match_chunk(task):
+    queries, shortlist_size, full_scan_fallback, bidirectional = task
+    return _worker_index.match_batch(queries, shortlist_size, full_scan_fallback, bidirectional)
+
+def iter_match_parallel(index, queries, workers, chunk_size=256, shortlist_size=None, full_scan_fallback=True,
+                        bidirectional=False):
+    """
+    使用进程池并行匹配，按输入顺序逐块产出 (块内歌曲数, [(位置, 得分), ...])。
+    歌曲索引只在创建进程池时共享一次，任务中只传递待匹配的歌曲。
+    """
+    global _worker_index
+    index.prepare_batch()
+    tasks = [
+        (queries[start:start + chunk_size], shortlist_size, full_scan_fallback, bidirectional)
+        for start in range(0, len(queries), chunk_size)
+    ]
+    # 只在 fork 已是平台默认时使用：macOS 上 Tk 启动后 fork 并不安全，
+    # GUI 在工作线程中匹配，Python 3.12+ 也会对多线程进程 fork 发出警告
+    if multiprocessing.get_start_method() == 'fork':
+        _worker_index = index
+        pool = multiprocessing.Pool(workers)
+    else:
+        pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(index,))
+    try:
+        for task, matches in zip(tasks, pool.imap(_match_chunk, tasks)):
+            yield len(task[0]), matches
+    finally:
+        pool.terminate()
+        _worker_index = None
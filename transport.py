@@ -0,0 +1,112 @@
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.exceptions import InsecureRequestWarning, NewConnectionError
+
+from metrics import metrics
+
+# 群晖常用自签名证书，请求默认不校验证书，禁用对应的警告
+requests.packages.urllib3.disable_warnings(category=InsecureRequestWarning)
+
+# 服务器繁忙或网关错误时可以重试的状态码
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+def connection_not_made(error):
+    """
+    请求异常是否发生在连接建立之前（连接超时、连接被拒绝、域名解析失败），此时请求一定没有送达服务器。
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+class SynologyTransport:
+    """
+    Synology WebAPI 的统一请求层。
+    所有请求共用一个连接池（长连接、gzip），对 5xx 和超时按指数退避重试，
+    并按 "API.method" 记录每次调用的次数、耗时、重试和响应大小。
+    """
+    def __init__(self, host, pool_size=16, retries=3, backoff_factor=0.5, timeout=10, verify=False):
+        self.host = host.rstrip('/')
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.verify = verify
+        self.session = requests.Session()
+        # 重试由 request 自行处理，这样可以区分幂等请求并统计重试次数
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive"
+        })
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def call(self, path, params, label, http_method='POST', timeout=None, idempotent=True):
+        """
+        调用 webapi 下的指定路径并解析 JSON。
+        请求失败时抛出 requests.RequestException，响应不是 JSON 时抛出 ValueError。
+        idempotent 为 False 的请求（如创建歌单、追加歌曲）只在连接未建立时重试，避免重复写入。
+        """
+        url = f"{self.host}/webapi/{path}"
+        timeout = timeout or self.timeout
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                if http_method == 'GET':
+                    response = self.session.get(url, params=params, verify=self.verify, timeout=timeout)
+                else:
+                    response = self.session.post(url, data=params, verify=self.verify, timeout=timeout)
+                if response.status_code in RETRY_STATUS_CODES and idempotent and attempt < self.retries:
+                    self._record(label, start, len(response.content), error=True)
+                    attempt += 1
+                    self._backoff(label, attempt)
+                    continue
+                response.raise_for_status()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record(label, start, 0, error=True)
+                retryable = idempotent or connection_not_made(e)
+                if retryable and attempt < self.retries:
+                    attempt += 1
+                    self._backoff(label, attempt)
+                    continue
+                raise
+            except requests.RequestException:
+                self._record(label, start, 0, error=True)
+                raise
+            self._record(label, start, len(response.content))
+            return response.json()
+
+    def _backoff(self, label, attempt):
+        with self.lock:
+            self.stats[label]['retries'] += 1
+        metrics.record_retry(label)
+        time.sleep(self.backoff_factor * (2 ** (attempt - 1)))
+
+    def _record(self, label, start, size, error=False):
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            stat = self.stats.setdefault(label, {
+                "count": 0, "errors": 0, "retries": 0, "bytes": 0, "total_time": 0.0, "max_time": 0.0
+            })
+            stat['count'] += 1
+            stat['bytes'] += size
+            stat['total_time'] += elapsed
+            stat['max_time'] = max(stat['max_time'], elapsed)
+            if error:
+                stat['errors'] += 1
+        metrics.record_request(label, elapsed, size, error)
+
+    def get_stats(self):
+        """
+        返回各 API 调用统计的副本，附带平均耗时。
+        """
+        with self.lock:
+            stats = {label: dict(stat) for label, stat in self.stats.items()}
+        for stat in stats.values():
+            stat['avg_time'] = stat['total_time'] / stat['count'] if stat['count'] else 0.0
+        return stats
@@ -1,4 +1,6 @@
+import os
 import re
+import hashlib
 from urllib.parse import urlparse, parse_qs
 
 def detect_platform(link):
@@ -13,4 +15,18 @@ def detect_platform(link):
     elif 'y.qq.com' in netloc or 'c.y.qq.com' in netloc or 't.qq.com' in netloc:
         return 'qqmusic'
     else:
-        return None
\ No newline at end of file
+        return None
+
+def get_cache_dir():
+    """
+    返回本地缓存目录，可通过环境变量 TNOS_CACHE_DIR 指定，默认为用户目录下的 .tnos_audiostation。
+    """
+    cache_dir = os.environ.get('TNOS_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.tnos_audiostation')
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+def cache_key(*parts):
+    """
+    根据若干字段生成适合作为文件名的缓存键。
+    """
+    return hashlib.sha1("|".join(str(p) for p in parts).encode('utf-8')).hexdigest()[:16]